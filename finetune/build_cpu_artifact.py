@@ -0,0 +1,74 @@
+"""
+Merge the trained LoRA adapter into gemma-2-2b-it and int8-quantize it for CPU.
+
+Output: a single cached artifact directory that GemmaAgent loads directly
+instead of base model + PeftModel.from_pretrained at every server start.
+  <out>/model.pt        full merged, dynamically quantized module (torch.save)
+  <out>/manifest.json   base model and adapter (path + sha256) it was built from;
+                        the server ignores the artifact once the adapter changes
+  <out>/tokenizer files
+
+Usage:
+  HF_TOKEN=hf_xxx python build_cpu_artifact.py \\
+      --adapter ../models/gemma-agent/final --out ../models/gemma-agent/cpu-int8
+"""
+import argparse, json, os, sys, time
+from pathlib import Path
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from peft import PeftModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from server.agent_gemma import adapter_fingerprint  # noqa: E402
+
+MODEL_ID = "google/gemma-2-2b-it"
+
+
+def build(base_model_id, adapter_path, out_dir, hf_token=None):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    fingerprint = adapter_fingerprint(adapter_path)
+    if fingerprint is None:
+        raise SystemExit(f"No adapter_* files in {adapter_path}")
+
+    print(f"Loading {base_model_id} (fp32) + adapter {adapter_path}...")
+    tokenizer = AutoTokenizer.from_pretrained(adapter_path, token=hf_token)
+    base = AutoModelForCausalLM.from_pretrained(
+        base_model_id,
+        token=hf_token,
+        torch_dtype=torch.float32,  # dynamic int8 quantization needs fp32 Linear weights
+        device_map="cpu",
+    )
+    model = PeftModel.from_pretrained(base, adapter_path)
+
+    print("Merging adapter into base weights...")
+    model = model.merge_and_unload()
+    model.eval()
+
+    print("Applying int8 dynamic quantization to Linear layers...")
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    # Pickled module: loading it runs code, so keep <out> writable by the server's user only.
+    torch.save(model, out / "model.pt")
+    tokenizer.save_pretrained(out)
+    manifest = {
+        "base_model_id": base_model_id,
+        **fingerprint,
+        "quantization": "dynamic-int8",
+        "torch_version": torch.__version__,
+        "built_at_unix": int(time.time()),
+    }
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    size_mb = (out / "model.pt").stat().st_size / 1e6
+    print(f"Saved {out}/model.pt ({size_mb:.0f} MB) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-model", default=os.getenv("GEMMA_BASE_MODEL", MODEL_ID))
+    parser.add_argument("--adapter", default=os.getenv("GEMMA_ADAPTER_PATH", "../models/gemma-agent/final"))
+    parser.add_argument("--out", default=os.getenv("GEMMA_CPU_ARTIFACT", "../models/gemma-agent/cpu-int8"))
+    args = parser.parse_args()
+    build(args.base_model, args.adapter, args.out, hf_token=os.getenv("HF_TOKEN"))
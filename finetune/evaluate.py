@@ -0,0 +1,169 @@
+"""
+Offline evaluation of the Gemma agent on data/eval.jsonl.
+
+Runs batched inference through GemmaAgent, scores each output against the
+labelled call (the rule spec the dataset was generated from) using
+_parse_output, and reports per-action precision/recall, exact-match rate,
+parse failures and latency. Decisions are timed per batch (one generate
+call), so the percentiles are over batches, not individual examples.
+Results are written as JSON so adapters can be compared run to run.
+
+Usage:
+  python evaluate.py --adapter ../models/gemma-agent/final --out results/adapter-v1.json
+  python evaluate.py --base-model <tiny-causal-lm> --no-adapter --limit 8   # CPU smoke run
+"""
+import argparse, ast, json, os, re, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.agent_gemma import ACTIONS, DecisionCache, GemmaAgent, _parse_output, match_call  # noqa: E402
+
+_SCENE_RE = re.compile(
+    r"Cups visible: (?P<count>\d+)\n"
+    r"Baseline: (?P<baseline>\d+)\n"
+    r"Diff: [+-]?\d+\n"
+    r"Streak: (?P<streak>\d+) consecutive discrepant frames\n"
+    r"Confidence: (?P<conf>[\d.]+)\n"
+    r"History: (?P<history>\[.*?\])"
+)
+
+
+def load_examples(path, limit=None):
+    """Return [(scene tuple, expected call)] from a generate_dataset.py JSONL file."""
+    examples = []
+    with open(path) as f:
+        for line in f:
+            text = json.loads(line)["text"]
+            m = _SCENE_RE.search(text)
+            if not m:
+                continue
+            expected = text.split("<start_of_turn>model\n", 1)[1].replace("<end_of_turn>", "").strip()
+            scene = (
+                int(m["count"]),
+                int(m["baseline"]),
+                int(m["streak"]),
+                float(m["conf"]),
+                list(ast.literal_eval(m["history"])),
+            )
+            examples.append((scene, expected))
+            if limit and len(examples) >= limit:
+                break
+    return examples
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def score(examples, predictions):
+    """Per-action precision/recall plus exact-match and parse-failure counts."""
+    counts = {a: {"tp": 0, "fp": 0, "fn": 0, "support": 0} for a in ACTIONS}
+    exact = parse_failures = correct = 0
+    for (scene, expected), pred in zip(examples, predictions):
+        want = _parse_output(expected, scene[0]).action
+        got = pred.action if pred is not None else None
+        counts[want]["support"] += 1
+        if pred is None or match_call(pred.raw_output) != "complete":
+            parse_failures += 1
+        if pred is not None and pred.raw_output.strip() == expected:
+            exact += 1
+        if got == want:
+            correct += 1
+            counts[want]["tp"] += 1
+        else:
+            counts[want]["fn"] += 1
+            if got in counts:
+                counts[got]["fp"] += 1
+
+    per_action = {}
+    for action, c in counts.items():
+        predicted = c["tp"] + c["fp"]
+        actual = c["tp"] + c["fn"]
+        per_action[action] = {
+            "precision": round(c["tp"] / predicted, 4) if predicted else 0.0,
+            "recall": round(c["tp"] / actual, 4) if actual else 0.0,
+            "support": c["support"],
+        }
+    n = len(examples)
+    return {
+        "n": n,
+        "accuracy": round(correct / n, 4) if n else 0.0,
+        "exact_match": round(exact / n, 4) if n else 0.0,
+        "parse_failures": parse_failures,
+        "per_action": per_action,
+    }
+
+
+def evaluate(agent, examples, batch_size):
+    predictions, batch_sec = [], []
+    for start in range(0, len(examples), batch_size):
+        batch = [scene for scene, _ in examples[start:start + batch_size]]
+        t0 = time.perf_counter()
+        decisions = agent.decide_batch(batch)
+        batch_sec.append(time.perf_counter() - t0)
+        if all(d is None for d in decisions):
+            # Inference itself failed (see the error above); scoring it would report 0% accuracy.
+            sys.exit(f"Every decision in batch {start // batch_size} (examples {start}..{start + len(batch) - 1}) "
+                     "came back empty; aborting.")
+        predictions.extend(decisions)
+
+    ordered = sorted(1000 * sec for sec in batch_sec)
+    total_sec = sum(batch_sec)
+    latency = {
+        "batches": len(ordered),
+        "batch_p50_ms": round(_percentile(ordered, 0.50), 2),
+        "batch_p90_ms": round(_percentile(ordered, 0.90), 2),
+        "batch_p99_ms": round(_percentile(ordered, 0.99), 2),
+        "batch_max_ms": round(ordered[-1], 2) if ordered else 0.0,
+        "mean_ms_per_decision": round(1000 * total_sec / len(examples), 2) if examples else 0.0,
+        "decisions_per_sec": round(len(examples) / total_sec, 3) if total_sec else 0.0,
+    }
+    return predictions, latency
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval", default="data/eval.jsonl")
+    parser.add_argument("--base-model", default=os.getenv("GEMMA_BASE_MODEL", "google/gemma-2-2b-it"))
+    parser.add_argument("--adapter", default=os.getenv("GEMMA_ADAPTER_PATH", "../models/gemma-agent/final"))
+    parser.add_argument("--no-adapter", action="store_true", help="evaluate the base checkpoint alone")
+    parser.add_argument("--cpu-artifact", default=None, help="merged int8 artifact dir to load instead")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--out", default="results/eval.json")
+    args = parser.parse_args()
+
+    agent = GemmaAgent(
+        args.base_model,
+        None if args.no_adapter else args.adapter,
+        os.getenv("HF_TOKEN"),
+        decision_cache=DecisionCache(max_size=0),  # every example runs through generate
+        cpu_artifact_path=args.cpu_artifact,
+    )
+    if not agent.load():
+        sys.exit("GemmaAgent failed to load; see error above.")
+
+    examples = load_examples(args.eval, args.limit)
+    predictions, latency = evaluate(agent, examples, args.batch_size)
+    report = {
+        "config": {
+            "base_model": args.base_model,
+            "adapter": None if args.no_adapter else args.adapter,
+            "cpu_artifact": args.cpu_artifact,
+            "batch_size": args.batch_size,
+            "eval_file": args.eval,
+        },
+        **score(examples, predictions),
+        "latency": latency,
+        "decode": agent.decode_stats(),
+    }
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"Accuracy {report['accuracy']:.3f}  exact {report['exact_match']:.3f}  "
+          f"{latency['mean_ms_per_decision']:.0f} ms/decision  "
+          f"batch p50 {latency['batch_p50_ms']:.0f} ms  p99 {latency['batch_p99_ms']:.0f} ms")
+    for action, m in report["per_action"].items():
+        print(f"  {action:<14} P={m['precision']:.3f} R={m['recall']:.3f} n={m['support']}")
+    print(f"Wrote {args.out}")
@@ -5,8 +5,26 @@ Clear decision rules:
   - streak >= 20              → rebaseline (count stable for too long)
   - streak < 6                → ignore_event (too early)
   - conf < 0.40               → ignore_event (unreliable)
+
+Generation is streamed, seeded and sharded:
+  - every shard has its own random.Random(seed, shard) and runs in a process pool
+  - scenes are hashed; a scene belongs to exactly one shard (hash % shards) and
+    to train or eval by hash, so duplicates are dropped without a global set
+    and eval never shares a scene with train
+  - every decision-rule boundary combination is emitted (each by its owning shard)
+  - each shard is shuffled before it is written, so boundary cases are not
+    front-loaded; class counts are tallied on the way
+
+The samplers can only produce about 77k distinct scenes (scene_space());
+--n beyond that is rejected instead of sampling forever for duplicates.
+
+Usage:
+  python generate_dataset.py                       # 500 examples → data/train.jsonl, data/eval.jsonl
+  python generate_dataset.py --n 50000 --shards 32 --workers 8 --seed 7
 """
-import json, random
+import argparse, hashlib, json, random, shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 SYSTEM = """You are an on-device inventory agent monitoring cups in a staging area.
@@ -17,6 +35,8 @@ Decision rules:
 - If confidence < 0.40: ignore_event (detection unreliable)
 Call exactly one function. Reply with ONLY the function call."""
 
+BASELINES = [3, 4, 5, 6, 8, 10]
+
 def scene(count, baseline, streak, conf, history):
     diff = count - baseline
     return (
@@ -35,74 +55,169 @@ def fmt(user, assistant):
         f"<start_of_turn>model\n{assistant}<end_of_turn>"
     )}
 
-def generate(n=500):
-    examples = []
-
-    # trigger_alert: streak 6-19, conf >= 0.40
-    for _ in range(n // 3):
-        baseline = random.choice([3, 4, 5, 6, 8, 10])
-        diff = random.choice([-1, -2, -3, 1, 2])
-        count = max(0, baseline + diff)
-        streak = random.randint(6, 19)
-        conf = round(random.uniform(0.40, 0.97), 2)
-        history = [baseline] * 2 + [count] * min(streak, 6)
-        n_word = abs(diff)
-        item = "cup" if n_word == 1 else "cups"
-        direction = "removed" if diff < 0 else "added"
-        sev = "high" if abs(diff) > 1 or streak > 12 else "medium"
-        call = f'trigger_alert(severity="{sev}", message="Mr. Richard, {n_word} {item} {direction} from staging area.")'
-        examples.append(fmt(scene(count, baseline, streak, conf, str(history[-8:])), call))
-
-    # rebaseline: streak >= 20
-    for _ in range(n // 5):
-        baseline = random.choice([3, 4, 5, 6, 8, 10])
-        diff = random.choice([-2, -3, 2, 3, -1, 1])
-        count = max(0, baseline + diff)
-        streak = random.randint(20, 40)
-        conf = round(random.uniform(0.50, 0.95), 2)
-        history = [baseline] * 2 + [count] * 6
-        call = f'rebaseline(new_count={count})'
-        examples.append(fmt(scene(count, baseline, streak, conf, str(history[-8:])), call))
-
-    # ignore — low streak (< 6)
-    for _ in range(n // 4):
-        baseline = random.choice([3, 4, 5, 6, 8, 10])
-        diff = random.choice([-1, 1, -2, 2])
-        count = max(0, baseline + diff)
-        streak = random.randint(1, 5)
-        conf = round(random.uniform(0.40, 0.96), 2)
-        history = [baseline, baseline, count, baseline, count, count]
-        call = f'ignore_event(reason="Only {streak} discrepant frames. Waiting for confirmation.")'
-        examples.append(fmt(scene(count, baseline, streak, conf, str(history[-8:])), call))
-
-    # ignore — low confidence (< 0.40)
-    for _ in range(n // 4):
-        baseline = random.choice([3, 4, 5, 6, 8, 10])
-        diff = random.choice([-1, 1, -2, 2])
-        count = max(0, baseline + diff)
-        streak = random.randint(1, 15)
-        conf = round(random.uniform(0.10, 0.39), 2)
-        history = [baseline, count, baseline, count, count]
-        call = f'ignore_event(reason="Confidence too low ({conf:.2f}). Detection unreliable.")'
-        examples.append(fmt(scene(count, baseline, streak, conf, str(history[-8:])), call))
-
-    return examples
+# ── One builder per class: parameters → (class, scene text, call) ─────────────
+def trigger_alert(baseline, diff, streak, conf):
+    count = max(0, baseline + diff)
+    history = [baseline] * 2 + [count] * min(streak, 6)
+    n_word = abs(diff)
+    item = "cup" if n_word == 1 else "cups"
+    direction = "removed" if diff < 0 else "added"
+    sev = "high" if abs(diff) > 1 or streak > 12 else "medium"
+    call = f'trigger_alert(severity="{sev}", message="Mr. Richard, {n_word} {item} {direction} from staging area.")'
+    return "trigger_alert", scene(count, baseline, streak, conf, str(history[-8:])), call
+
+def rebaseline(baseline, diff, streak, conf):
+    count = max(0, baseline + diff)
+    history = [baseline] * 2 + [count] * 6
+    call = f'rebaseline(new_count={count})'
+    return "rebaseline", scene(count, baseline, streak, conf, str(history[-8:])), call
+
+def ignore_low_streak(baseline, diff, streak, conf):
+    count = max(0, baseline + diff)
+    history = [baseline, baseline, count, baseline, count, count]
+    call = f'ignore_event(reason="Only {streak} discrepant frames. Waiting for confirmation.")'
+    return "ignore_event", scene(count, baseline, streak, conf, str(history[-8:])), call
+
+def ignore_low_conf(baseline, diff, streak, conf):
+    count = max(0, baseline + diff)
+    history = [baseline, count, baseline, count, count]
+    call = f'ignore_event(reason="Confidence too low ({conf:.2f}). Detection unreliable.")'
+    return "ignore_event", scene(count, baseline, streak, conf, str(history[-8:])), call
+
+# (weight, builder, diffs, streak range, conf range) — weights match the old n//3, n//5, n//4, n//4 mix.
+SAMPLERS = [
+    (1 / 3, trigger_alert,     [-1, -2, -3, 1, 2],   (6, 19),  (0.40, 0.97)),
+    (1 / 5, rebaseline,        [-2, -3, 2, 3, -1, 1], (20, 40), (0.50, 0.95)),
+    (1 / 4, ignore_low_streak, [-1, 1, -2, 2],       (1, 5),   (0.40, 0.96)),
+    (1 / 4, ignore_low_conf,   [-1, 1, -2, 2],       (1, 15),  (0.10, 0.39)),
+]
+
+def sample(rng):
+    weights = [s[0] for s in SAMPLERS]
+    _, build, diffs, (s_lo, s_hi), (c_lo, c_hi) = rng.choices(SAMPLERS, weights=weights)[0]
+    return build(rng.choice(BASELINES), rng.choice(diffs), rng.randint(s_lo, s_hi), round(rng.uniform(c_lo, c_hi), 2))
+
+def rule_builder(streak, conf):
+    """Builder the decision rules prescribe; None where the rules conflict."""
+    if streak >= 20:
+        return rebaseline if conf >= 0.40 else None
+    if conf < 0.40:
+        return ignore_low_conf
+    return trigger_alert if streak >= 6 else ignore_low_streak
+
+def boundary_examples():
+    """Every baseline × diff on both sides of each threshold (streak 5/6, 19/20; conf 0.39/0.40)."""
+    for baseline in BASELINES:
+        for diff in [-3, -2, -1, 1, 2, 3]:
+            for streak in [5, 6, 19, 20]:
+                for conf in [0.39, 0.40]:
+                    build = rule_builder(streak, conf)
+                    if build is not None:
+                        yield build(baseline, diff, streak, conf)
+
+def scene_hash(user):
+    return int.from_bytes(hashlib.blake2b(user.encode(), digest_size=8).digest(), "big")
+
+def _steps(lo, hi):
+    """The values round(rng.uniform(lo, hi), 2) can take."""
+    return [round(lo + i / 100, 2) for i in range(round((hi - lo) * 100) + 1)]
+
+def scene_space():
+    """Hashes of every distinct scene the samplers and boundary cases can produce."""
+    hashes = {scene_hash(user) for _, user, _ in boundary_examples()}
+    for _, build, diffs, (s_lo, s_hi), (c_lo, c_hi) in SAMPLERS:
+        for baseline in BASELINES:
+            for diff in diffs:
+                for streak in range(s_lo, s_hi + 1):
+                    for conf in _steps(c_lo, c_hi):
+                        hashes.add(scene_hash(build(baseline, diff, streak, conf)[1]))
+    return hashes
+
+# ── Shard worker ───────────────────────────────────────────────────────────────
+def generate_shard(shard, shards, quota, seed, eval_every, out_dir, stale_factor=200):
+    rng = random.Random(f"{seed}:{shard}")
+    seen = set()
+    counts = {"train": Counter(), "eval": Counter()}
+    lines = {split: [] for split in counts}  # bounded by the shard's slice of scene_space()
+    out = Path(out_dir)
+    paths = {split: out / f"{split}-{shard:05d}-of-{shards:05d}.jsonl" for split in counts}
+
+    def emit(example):
+        label, user, call = example
+        h = scene_hash(user)
+        if h % shards != shard or h in seen:
+            return False
+        seen.add(h)
+        split = "eval" if (h // shards) % eval_every == 0 else "train"
+        lines[split].append(json.dumps(fmt(user, call)) + "\n")
+        counts[split][label] += 1
+        return True
+
+    written = 0
+    for example in boundary_examples():
+        written += emit(example)
+    # Rare scenes of a nearly exhausted slice can take long to draw; give up after a dry spell.
+    since_last_write = 0
+    while written < quota and since_last_write < shards * stale_factor:
+        if emit(sample(rng)):
+            written += 1
+            since_last_write = 0
+        else:
+            since_last_write += 1
+    for split, path in paths.items():
+        rng.shuffle(lines[split])
+        with open(path, "w") as f:
+            f.writelines(lines[split])
+    return shard, {split: dict(c) for split, c in counts.items()}, {k: str(v) for k, v in paths.items()}
+
+def merge(shard_paths, dest):
+    with open(dest, "wb") as out:
+        for path in shard_paths:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out)
 
 if __name__ == "__main__":
-    data = generate(500)
-    random.shuffle(data)
-    split = int(len(data) * 0.9)
-
-    Path("data").mkdir(exist_ok=True)
-    with open("data/train.jsonl", "w") as f:
-        for ex in data[:split]: f.write(json.dumps(ex) + "\n")
-    with open("data/eval.jsonl", "w") as f:
-        for ex in data[split:]: f.write(json.dumps(ex) + "\n")
-
-    print(f"Generated {split} train + {len(data)-split} eval examples")
-    # Count by class
-    calls = [json.loads(l)["text"].split("<start_of_turn>model\n")[1] for l in open("data/train.jsonl")]
-    alerts = sum(1 for c in calls if c.startswith("trigger"))
-    rebases = sum(1 for c in calls if c.startswith("rebase"))
-    ignores = sum(1 for c in calls if c.startswith("ignore"))
-    print(f"  trigger_alert: {alerts}, rebaseline: {rebases}, ignore_event: {ignores}")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=500, help="target number of unique examples")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--eval-frac", type=float, default=0.1)
+    parser.add_argument("--out", default="data")
+    args = parser.parse_args()
+
+    space = scene_space()
+    if args.n > len(space):
+        parser.error(f"--n {args.n} exceeds the {len(space)} distinct scenes the samplers can produce")
+    shard_sizes = Counter(h % args.shards for h in space)
+
+    shard_dir = Path(args.out) / "shards"
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    quota = -(-args.n // args.shards)
+    eval_every = max(1, round(1 / args.eval_frac)) if args.eval_frac > 0 else 1 << 62
+
+    totals = {"train": Counter(), "eval": Counter()}
+    paths = {"train": [], "eval": []}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(
+                generate_shard, shard, args.shards, min(quota, shard_sizes[shard]), args.seed, eval_every, str(shard_dir)
+            )
+            for shard in range(args.shards)
+        ]
+        for fut in futures:  # submission order keeps the merged files deterministic
+            _, counts, shard_paths = fut.result()
+            for split in totals:
+                totals[split].update(counts[split])
+                paths[split].append(shard_paths[split])
+
+    for split in totals:
+        merge(paths[split], Path(args.out) / f"{split}.jsonl")
+
+    n_train, n_eval = sum(totals["train"].values()), sum(totals["eval"].values())
+    print(f"Generated {n_train} train + {n_eval} eval examples ({args.shards} shards, seed {args.seed})")
+    if n_train + n_eval < args.n:
+        print(f"  short of --n {args.n}: the remaining scenes are too rare to sample; ask for fewer")
+    for split in ("train", "eval"):
+        c = totals[split]
+        print(f"  {split}: trigger_alert: {c['trigger_alert']}, rebaseline: {c['rebaseline']}, ignore_event: {c['ignore_event']}")
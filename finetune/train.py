@@ -8,17 +8,20 @@ Fine-tuning type: QLoRA (Quantized LoRA / SFT)
 
 Usage:
   HF_TOKEN=hf_xxx python train.py
+  PACKED_DATA=data/packed-512 HF_TOKEN=hf_xxx python train.py   # pre-tokenized, packed (pack_dataset.py)
 """
 import os
-from datasets import Dataset
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+from datasets import Dataset, load_from_disk
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, Trainer, TrainingArguments
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
 from trl import SFTTrainer, SFTConfig
+from pack_dataset import PackedCollator
 import torch, json
 
-HF_TOKEN   = os.environ["HF_TOKEN"]
-MODEL_ID   = "google/gemma-2-2b-it"
-OUTPUT_DIR = "./gemma-inventory-agent"
+HF_TOKEN    = os.environ["HF_TOKEN"]
+MODEL_ID    = "google/gemma-2-2b-it"
+OUTPUT_DIR  = "./gemma-inventory-agent"
+PACKED_DATA = os.environ.get("PACKED_DATA")  # e.g. data/packed-512; unset → raw JSONL via SFTTrainer
 
 # ── 4-bit quantization config (QLoRA) ─────────────────────────────────────────
 bnb_config = BitsAndBytesConfig(
@@ -54,13 +57,9 @@ model = prepare_model_for_kbit_training(model)
 model = get_peft_model(model, lora_config)
 model.print_trainable_parameters()
 
-train_ds = Dataset.from_list(load_jsonl("data/train.jsonl"))
-eval_ds  = Dataset.from_list(load_jsonl("data/eval.jsonl"))
-
-training_args = SFTConfig(
+common_args = dict(
     output_dir=OUTPUT_DIR,
     num_train_epochs=10,
-    per_device_train_batch_size=16,
     gradient_accumulation_steps=1,
     warmup_steps=10,
     learning_rate=2e-4,
@@ -72,19 +71,59 @@ training_args = SFTConfig(
     save_total_limit=1,
     load_best_model_at_end=True,
     report_to="none",
-    dataset_text_field="text",
 )
 
-trainer = SFTTrainer(
-    model=model,
-    args=training_args,
-    train_dataset=train_ds,
-    eval_dataset=eval_ds,
-    processing_class=tokenizer,
-)
+if PACKED_DATA:
+    # Tokenized once by pack_dataset.py; each row holds several examples.
+    train_ds = load_from_disk(f"{PACKED_DATA}/train")
+    eval_ds  = load_from_disk(f"{PACKED_DATA}/eval")
+    with open(f"{PACKED_DATA}/meta.json") as f:
+        train_tokens = json.load(f)["splits"]["train"]["real_tokens"]
+
+    trainer = Trainer(
+        model=model,
+        args=TrainingArguments(
+            **common_args,
+            per_device_train_batch_size=int(os.environ.get("PACKED_BATCH_SIZE", "4")),
+            remove_unused_columns=False,  # segment_ids is consumed by the collator
+        ),
+        train_dataset=train_ds,
+        eval_dataset=eval_ds,
+        data_collator=PackedCollator(dtype=torch.bfloat16),
+    )
+else:
+    train_rows = load_jsonl("data/train.jsonl")
+    train_ds = Dataset.from_list(train_rows)
+    eval_ds  = Dataset.from_list(load_jsonl("data/eval.jsonl"))
+    train_tokens = sum(len(tokenizer(r["text"])["input_ids"]) + 1 for r in train_rows)
+
+    trainer = SFTTrainer(
+        model=model,
+        args=SFTConfig(
+            **common_args,
+            per_device_train_batch_size=16,
+            dataset_text_field="text",
+        ),
+        train_dataset=train_ds,
+        eval_dataset=eval_ds,
+        processing_class=tokenizer,
+    )
 
 print("Training...")
-trainer.train()
+result = trainer.train()
+runtime = result.metrics["train_runtime"]
+epochs  = common_args["num_train_epochs"]
+throughput = {
+    "mode": "packed" if PACKED_DATA else "unpacked",
+    "train_tokens_per_epoch": train_tokens,
+    "tokens_per_sec": round(train_tokens * epochs / runtime, 1),
+    "epoch_time_sec": round(runtime / epochs, 2),
+}
+print(f"Throughput ({throughput['mode']}): {throughput['tokens_per_sec']} tokens/s, "
+      f"{throughput['epoch_time_sec']} s/epoch")
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+with open(f"{OUTPUT_DIR}/throughput-{throughput['mode']}.json", "w") as f:
+    json.dump(throughput, f, indent=2)
 trainer.model.save_pretrained(f"{OUTPUT_DIR}/final")
 tokenizer.save_pretrained(f"{OUTPUT_DIR}/final")
 print(f"Saved to {OUTPUT_DIR}/final")
@@ -0,0 +1,124 @@
+"""
+Sweep debounce_k / cooldown_sec offline against recorded count sequences.
+
+Sources:
+  --db inventory_events.db     armed segments from the observations table
+                               (logged every 3rd frame, so k is in logged frames)
+  --recording session.edrec    counts produced by running the vision backend
+                               over a recorded session (--vision stub|yolo)
+
+Smoothing defaults to the server's COUNT_SMOOTHING / COUNT_WINDOW, so the
+alerts match what the live state machine would do with the same settings.
+
+Usage:
+  python scripts/backtest_state_machine.py --db inventory_events.db --k 3 4 5 6 8 --cooldown 5 10 20
+  python scripts/backtest_state_machine.py --db inventory_events.db --smoothing mode --window 10 --verify
+  python scripts/backtest_state_machine.py --recording recordings/x.edrec --vision stub --verify
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from server.backtest import CountSeries, series_from_observations, simulate, simulate_online, sweep  # noqa: E402
+from server.db import EventDB  # noqa: E402
+from server.recording import read_recording  # noqa: E402
+from server.rolling import SMOOTHING_METHODS  # noqa: E402
+from server.settings import settings  # noqa: E402
+
+
+def series_from_recording(path: str, vision: str, baseline: int | None, arm_after: int) -> list[CountSeries]:
+    import cv2
+
+    from server.vision import ChairCounter, StubCounter
+
+    counter = StubCounter() if vision == "stub" else ChairCounter(
+        model_name=settings.yolo_model,
+        chair_class_name=settings.chair_class_name,
+        conf_threshold=settings.conf_threshold,
+    )
+    ts, counts = [], []
+    for timestamp_ms, jpeg in read_recording(path):
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            continue
+        ts.append(timestamp_ms / 1000)
+        counts.append(counter.count_chairs(frame).chair_count)
+    if not counts:
+        return []
+    if baseline is None:
+        # Same as pressing Set Baseline after arm_after frames: the most common early count.
+        baseline = Counter(counts[:arm_after]).most_common(1)[0][0]
+    start = min(arm_after, len(counts) - 1)
+    return [CountSeries(np.asarray(ts[start:], dtype=np.float64), np.asarray(counts[start:], dtype=np.int64), baseline)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db")
+    source.add_argument("--recording")
+    parser.add_argument("--vision", choices=["stub", "yolo"], default="yolo")
+    parser.add_argument("--baseline", type=int, default=None)
+    parser.add_argument("--arm-after", type=int, default=10)
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 3, 4, 5, 6, 8, 10])
+    parser.add_argument("--cooldown", type=float, nargs="+", default=[0, 5, 10, 20, 30])
+    parser.add_argument("--smoothing", choices=SMOOTHING_METHODS, default=settings.count_smoothing)
+    parser.add_argument("--window", type=int, default=settings.count_window,
+                        help="smoothing window in evaluated frames (logged frames for --db)")
+    parser.add_argument("--truth-min-sec", type=float, default=2.0,
+                        help="discrepancies lasting at least this long count as real")
+    parser.add_argument("--verify", action="store_true", help="check every grid point against InventoryStateMachine")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    if args.db:
+        series = series_from_observations(EventDB(args.db).iter_observations())
+    else:
+        series = series_from_recording(args.recording, args.vision, args.baseline, args.arm_after)
+    if not series:
+        sys.exit("No armed count sequences found.")
+    frames = sum(len(s.counts) for s in series)
+
+    started = time.perf_counter()
+    results = sweep(series, args.k, args.cooldown, args.truth_min_sec, args.smoothing, args.window)
+    elapsed = time.perf_counter() - started
+    print(f"{len(series)} segments, {frames} frames, {len(results)} parameter sets in {elapsed * 1000:.1f} ms "
+          f"(smoothing={args.smoothing}, window={args.window})\n")
+
+    if args.verify:
+        for s in series:
+            for k in args.k:
+                for cooldown in args.cooldown:
+                    fast = simulate(s, k, cooldown, smoothing=args.smoothing, window=args.window)
+                    reference = simulate_online(s, k, cooldown, smoothing=args.smoothing, window=args.window)
+                    if not np.array_equal(fast, reference):
+                        sys.exit(f"Mismatch with InventoryStateMachine at k={k}, cooldown={cooldown}")
+        print("Verified: identical alerts to InventoryStateMachine for every parameter set.\n")
+
+    print(f"{'k':>3} {'cooldown':>8} {'alerts':>6} {'false':>6} {'FAR':>6} {'detected':>8} {'missed':>6} {'delay':>7}")
+    for r in results:
+        delay = f"{r['delay_mean_sec']:.2f}s" if r["delay_mean_sec"] is not None else "-"
+        print(f"{r['debounce_k']:>3} {r['cooldown_sec']:>8g} {r['alerts']:>6} {r['false_alerts']:>6} "
+              f"{r['false_alert_rate']:>6.2f} {r['detected']:>8} {r['missed']:>6} {delay:>7}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "frames": frames,
+            "segments": len(series),
+            "smoothing": args.smoothing,
+            "window": args.window,
+            "results": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measure batched GemmaAgent throughput (decisions/sec) at batch sizes 1-16.
+
+Each batch holds distinct scenes and the decision cache is bypassed, so
+every decision runs through generate.
+
+Usage:
+  python scripts/bench_gemma_batch.py --sizes 1 2 4 8 16 --rounds 3
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.agent_gemma import GemmaAgent  # noqa: E402
+from server.settings import settings  # noqa: E402
+
+
+def _scenes(n: int, offset: int) -> list[tuple[int, int, int, float, list[int]]]:
+    scenes = []
+    for i in range(n):
+        j = i + offset
+        baseline = 3 + j % 6
+        count = max(0, baseline + (-1, 1, -2, 2)[j % 4])
+        streak = 1 + (j * 7) % 30
+        conf = round(0.25 + (j * 13 % 70) / 100, 2)
+        scenes.append((count, baseline, streak, conf, [baseline] * 2 + [count] * min(streak, 6)))
+    return scenes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    agent = GemmaAgent(
+        settings.gemma_base_model,
+        settings.gemma_adapter_path,
+        settings.gemma_hf_token,
+        cpu_artifact_path=settings.gemma_cpu_artifact,
+    )
+    if not agent.load():
+        sys.exit("GemmaAgent failed to load; see error above.")
+    agent._generate_batch(_scenes(2, 0))  # warmup
+
+    print(f"{'batch':>5} | {'decisions/sec':>13} | {'sec/batch':>9}")
+    for size in args.sizes:
+        started = time.perf_counter()
+        for r in range(args.rounds):
+            agent._generate_batch(_scenes(size, r * size))
+        elapsed = time.perf_counter() - started
+        print(f"{size:>5} | {size * args.rounds / elapsed:>13.2f} | {elapsed / args.rounds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare the merged int8 CPU artifact against base + PeftModel loading.
+
+Each path runs in its own subprocess so load time and peak resident memory
+are measured from a cold interpreter. Per-decision latency bypasses the
+decision cache.
+
+Usage:
+  python finetune/build_cpu_artifact.py   # once, to create the artifact
+  python scripts/bench_gemma_load.py --runs 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SCENES = [
+    (4, 5, 3, 0.72, [5, 5, 4, 4, 4]),
+    (3, 5, 8, 0.66, [5, 5, 3, 3, 3, 3, 3, 3]),
+    (6, 5, 22, 0.81, [5, 5, 6, 6, 6, 6, 6, 6]),
+    (2, 4, 10, 0.31, [4, 2, 4, 2, 2]),
+]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1024
+
+
+def _child(mode: str, runs: int) -> None:
+    from server.agent_gemma import GemmaAgent
+    from server.settings import settings
+
+    agent = GemmaAgent(
+        settings.gemma_base_model,
+        settings.gemma_adapter_path,
+        settings.gemma_hf_token,
+        cpu_artifact_path=settings.gemma_cpu_artifact if mode == "artifact" else None,
+    )
+    if mode == "artifact":
+        import torch
+
+        # GemmaAgent.load() only takes the artifact on CPU; without this an MPS
+        # machine would quietly benchmark base + PEFT twice.
+        torch.backends.mps.is_available = lambda: False
+        if agent._cpu_artifact() is None:
+            print(json.dumps({
+                "mode": mode,
+                "error": f"no usable CPU artifact at {settings.gemma_cpu_artifact!r} "
+                         "(missing, stale or untrusted; rebuild with finetune/build_cpu_artifact.py)",
+            }))
+            return
+    started = time.perf_counter()
+    if not agent.load():
+        print(json.dumps({"mode": mode, "error": agent._load_error}))
+        return
+    load_sec = time.perf_counter() - started
+
+    agent._generate_decision(*SCENES[0])  # warmup
+    latencies = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        agent._generate_decision(*SCENES[i % len(SCENES)])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    print(json.dumps({
+        "mode": mode,
+        "load_sec": round(load_sec, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "decide_median_ms": round(statistics.median(latencies), 1),
+        "decide_p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 1),
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", choices=["peft", "artifact"])
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.runs)
+        return
+
+    for mode in ("peft", "artifact"):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--runs", str(args.runs)],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        print(lines[-1] if lines else f'{{"mode": "{mode}", "error": {json.dumps(proc.stderr[-500:])}}}')
+
+
+if __name__ == "__main__":
+    main()
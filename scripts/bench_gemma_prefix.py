@@ -0,0 +1,79 @@
+"""
+Benchmark GemmaAgent decide latency with and without SYSTEM_PREFIX KV reuse.
+
+Reports time-to-first-token (generate with max_new_tokens=1) and total
+decide latency on CPU for both modes. The decision cache is bypassed.
+
+Usage:
+  python scripts/bench_gemma_prefix.py --runs 20
+  GEMMA_ADAPTER_PATH=./models/gemma-agent/final python scripts/bench_gemma_prefix.py
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.agent_gemma import GemmaAgent  # noqa: E402
+from server.settings import settings  # noqa: E402
+
+SCENES = [
+    (4, 5, 3, 0.72, [5, 5, 4, 4, 4]),
+    (3, 5, 8, 0.66, [5, 5, 3, 3, 3, 3, 3, 3]),
+    (6, 5, 22, 0.81, [5, 5, 6, 6, 6, 6, 6, 6]),
+    (2, 4, 10, 0.31, [4, 2, 4, 2, 2]),
+]
+
+
+def _time_decisions(agent: GemmaAgent, runs: int) -> list[float]:
+    samples: list[float] = []
+    for i in range(runs):
+        scene = SCENES[i % len(SCENES)]
+        started = time.perf_counter()
+        agent._generate_decision(*scene)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _summary(samples: list[float]) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"median={statistics.median(ordered):8.1f} ms  p95={p95:8.1f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--base-model", default=settings.gemma_base_model)
+    parser.add_argument("--adapter", default=settings.gemma_adapter_path)
+    args = parser.parse_args()
+
+    agent = GemmaAgent(args.base_model, args.adapter, settings.gemma_hf_token, reuse_prefix_cache=True)
+    if not agent.load():
+        sys.exit("GemmaAgent failed to load; see error above.")
+    if agent._prefix_cache is None:
+        sys.exit("Prefix cache could not be built for this model.")
+
+    for reuse in (False, True):
+        agent.reuse_prefix_cache = reuse
+        label = "prefix reuse" if reuse else "full prefill"
+
+        agent.max_new_tokens = 1
+        _time_decisions(agent, args.warmup)
+        ttft = _time_decisions(agent, args.runs)
+
+        agent.max_new_tokens = 40
+        _time_decisions(agent, args.warmup)
+        total = _time_decisions(agent, args.runs)
+
+        print(f"{label:>13} | TTFT   {_summary(ttft)}")
+        print(f"{label:>13} | decide {_summary(total)}")
+
+
+if __name__ == "__main__":
+    main()
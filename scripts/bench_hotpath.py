@@ -0,0 +1,273 @@
+"""
+Micro-benchmarks for the vision and ingest hot path.
+
+Covers _decode_b64_jpeg and _resize_for_model at several frame sizes,
+ChairCounter.count_chairs post-processing on synthetic YOLO boxes (no model
+download), OccupancyHeatmap.update on those boxes,
+InventoryStateMachine.evaluate (bare and through each state backend's
+transaction), and status/activity payload construction + JSON
+serialization at several detection counts.
+
+Each case is timed over --repeats rounds of an auto-sized inner loop;
+median/min/stdev per call are printed and saved as JSON. Passing
+--compare flags cases whose median regressed by more than --threshold.
+
+Timings only compare on the same machine, so no baseline is committed:
+record one first (on the reference machine, before the change under test),
+then compare against it.
+
+Usage:
+  python scripts/bench_hotpath.py --save-baseline                  # writes bench/baseline.json
+  python scripts/bench_hotpath.py --compare --threshold 0.15       # exits 1 on regressions
+  python scripts/bench_hotpath.py --out bench/current.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+# server.main builds its singletons at import time; keep them model-free.
+os.environ.setdefault("VISION_BACKEND", "stub")
+os.environ.setdefault("GEMMA_ENABLED", "false")
+os.environ.setdefault("SQLITE_PATH", str(Path(tempfile.mkdtemp()) / "bench.db"))
+os.environ.setdefault("STATE_CHECKPOINT_PATH", "")
+os.environ.setdefault("SNAPSHOT_DIR", "")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import base64  # noqa: E402
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from server import main  # noqa: E402
+from server.backend import InProcessStateBackend, SharedStateBackend  # noqa: E402
+from server.heatmap import OccupancyHeatmap  # noqa: E402
+from server.state import InventoryStateMachine  # noqa: E402
+from server.vision import ChairCounter  # noqa: E402
+
+FRAME_SIZES = [(640, 360), (1280, 720), (1920, 1080)]
+DETECTION_COUNTS = [0, 5, 50, 300]
+
+
+def measure(fn: Callable[[], Any], repeats: int, min_round_sec: float) -> dict[str, float]:
+    """Per-call seconds over `repeats` rounds; the inner loop is sized so a round lasts min_round_sec."""
+    fn()
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - started >= min_round_sec or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    per_call = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_call.append((time.perf_counter() - started) / loops)
+    return {
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(per_call) * 1e6, 3) if len(per_call) > 1 else 0.0,
+        "loops": loops,
+    }
+
+
+def _frame(width: int, height: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    # Smooth gradient + noise so JPEG size is realistic rather than trivially small.
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 20, (height, width, 3)).astype(np.float32)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+class _Tensor:
+    def __init__(self, values: list):
+        self._values = values
+
+    def tolist(self) -> list:
+        return self._values
+
+
+class _Boxes:
+    def __init__(self, n: int, width: int, height: int, chair_id: int):
+        rng = np.random.default_rng(n)
+        self.cls = _Tensor([float(chair_id if i % 3 else chair_id + 1) for i in range(n)])
+        self.conf = _Tensor(rng.uniform(0.05, 0.95, n).tolist())
+        xy = rng.uniform(0, 1, (n, 2)) * [width * 0.8, height * 0.8]
+        wh = rng.uniform(0.05, 0.2, (n, 2)) * [width, height]
+        self.xyxy = _Tensor(np.hstack([xy, xy + wh]).tolist())
+
+
+class _Result:
+    def __init__(self, boxes: _Boxes):
+        self.boxes = boxes
+
+
+class _StubModel:
+    """Returns fixed synthetic boxes so only ChairCounter post-processing is timed."""
+
+    def __init__(self, boxes: _Boxes):
+        self._results = [_Result(boxes)]
+
+    def predict(self, frame: np.ndarray, verbose: bool = False) -> list[_Result]:
+        return self._results
+
+
+def _counter_with_boxes(n: int, width: int, height: int) -> ChairCounter:
+    counter = ChairCounter.__new__(ChairCounter)
+    counter.conf_threshold = 0.35
+    counter.chair_class_id = 56
+    counter.model = _StubModel(_Boxes(n, width, height, counter.chair_class_id))
+    return counter
+
+
+class _SinkWebSocket:
+    """send_json serializes like Starlette does, without any network I/O."""
+
+    async def send_json(self, data: Any) -> None:
+        json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _run_sync(coro: Any) -> None:
+    # The sink never suspends, so the coroutine completes on the first send().
+    try:
+        coro.send(None)
+    except StopIteration:
+        pass
+
+
+def build_cases() -> dict[str, Callable[[], Any]]:
+    cases: dict[str, Callable[[], Any]] = {}
+
+    for width, height in FRAME_SIZES:
+        frame = _frame(width, height)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        assert ok
+        jpeg_b64 = base64.b64encode(buf.tobytes()).decode()
+        cases[f"decode_b64_jpeg/{width}x{height}"] = lambda b=jpeg_b64: main._decode_b64_jpeg(b)
+        cases[f"resize_for_model/{width}x{height}"] = lambda f=frame: main._resize_for_model(f)
+
+    frame = _frame(960, 540)
+    for n in DETECTION_COUNTS:
+        counter = _counter_with_boxes(n, 960, 540)
+        cases[f"count_chairs_post/{n}_boxes"] = lambda c=counter: c.count_chairs(frame)
+        boxes = counter.count_chairs(frame).detections
+        cases[f"heatmap_update/{len(boxes)}_boxes"] = lambda h=OccupancyHeatmap(), b=boxes: h.update(b)
+
+    sm = InventoryStateMachine(debounce_k=5, cooldown_sec=0)  # no cooldown: stay on the ARMED path
+    sm.on_stream_started()
+    sm.set_baseline(5)
+    sm.arm()
+    counts = [5, 5, 4, 5, 4, 4, 5, 6]
+    step = iter(range(1 << 62))
+    cases["state_machine_evaluate"] = lambda: sm.evaluate(counts[next(step) % len(counts)])
+
+    backends = {
+        "memory": InProcessStateBackend(InventoryStateMachine(debounce_k=5, cooldown_sec=0)),
+        "shared": SharedStateBackend(tempfile.mkdtemp(), debounce_k=5, cooldown_sec=0),
+    }
+    for name, backend in backends.items():
+        with backend.transaction() as machine:
+            machine.on_stream_started()
+            machine.set_baseline(5)
+            machine.arm()
+
+        def evaluate_in_transaction(b=backend) -> None:
+            with b.transaction() as machine:
+                machine.evaluate(counts[next(step) % len(counts)])
+
+        cases[f"state_backend_evaluate/{name}"] = evaluate_in_transaction
+
+    live = InventoryStateMachine(debounce_k=5, cooldown_sec=10)
+    live.on_stream_started()
+    live.evaluate(4)
+    live.set_baseline(5)
+    live.arm()
+    live.evaluate(4)
+    ws = _SinkWebSocket()
+    for n in DETECTION_COUNTS:
+        vision = _counter_with_boxes(n, 960, 540).count_chairs(frame)
+
+        def status_payload(v=vision) -> None:
+            detections = [
+                {"x1_norm": d.x1_norm, "y1_norm": d.y1_norm, "x2_norm": d.x2_norm, "y2_norm": d.y2_norm, "conf": d.conf}
+                for d in v.detections
+            ]
+            _run_sync(main._send_status(ws, sm=live, average_conf=v.average_conf, timestamp_ms=0, detections=detections))
+            json.dumps(main._activity_payload(sm=live, timestamp_ms=0, average_conf=v.average_conf, detections=detections))
+
+        cases[f"status_payload/{len(vision.detections)}_detections"] = status_payload
+    return cases
+
+
+DEFAULT_BASELINE = "bench/baseline.json"
+
+
+def compare(current: dict[str, Any], baseline_path: str, threshold: float) -> int:
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    regressions = 0
+    print(f"\n{'case':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["median_us"]
+        after = result["median_us"]
+        change = (after - before) / before if before else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"{name:<40} {before:>10.2f}us {after:>10.2f}us {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--min-round-sec", type=float, default=0.05)
+    parser.add_argument("--filter", default="", help="only run cases containing this substring")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help=f"record this run as the baseline (default path {DEFAULT_BASELINE})")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help=f"baseline JSON from --save-baseline or --out (default path {DEFAULT_BASELINE})")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+    if args.compare and not Path(args.compare).exists():
+        sys.exit(f"No baseline at {args.compare}; record one first with --save-baseline {args.compare}")
+
+    results: dict[str, Any] = {}
+    print(f"{'case':<40} {'median':>12} {'min':>12} {'stdev':>10}")
+    for name, fn in build_cases().items():
+        if args.filter not in name:
+            continue
+        r = measure(fn, args.repeats, args.min_round_sec)
+        results[name] = r
+        print(f"{name:<40} {r['median_us']:>10.2f}us {r['min_us']:>10.2f}us {r['stdev_us']:>8.2f}us")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "results": results,
+    }
+    for path in filter(None, (args.out, args.save_baseline)):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(report, indent=2))
+        print(f"\nSaved {path}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
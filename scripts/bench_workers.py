@@ -0,0 +1,115 @@
+"""
+Benchmark /ws throughput as the number of uvicorn workers grows.
+
+For each worker count the server is started with the stub detector (no
+model, no Gemma), STATE_BACKEND=shared for more than one worker, and a
+fresh state directory. Several replay_load.py processes then stream a
+recording in closed loop (each phone sends its next frame when the status
+for the previous one arrives), so throughput is bounded by the server.
+
+Usage:
+  python scripts/replay_load.py --synthesize recordings/synthetic.edrec --frames 300
+  python scripts/bench_workers.py recordings/synthetic.edrec --workers 1 2 4 --clients 16
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+
+def run_one(recording: str, workers: int, clients: int, load_procs: int, port: int, max_frames: int) -> dict:
+    work = Path(tempfile.mkdtemp(prefix=f"bench-workers-{workers}-"))
+    env = {
+        **os.environ,
+        "VISION_BACKEND": "stub",
+        "GEMMA_ENABLED": "false",
+        "SQLITE_PATH": str(work / "events.db"),
+        "STATE_CHECKPOINT_PATH": "",
+        "STATE_BACKEND": "shared" if workers > 1 else "memory",
+        "STATE_SHARED_DIR": str(work / "state"),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        wait_ready(port)
+        per_proc = [clients // load_procs + (i < clients % load_procs) for i in range(load_procs)]
+        loaders = []
+        for i, n in enumerate(c for c in per_proc if c):
+            cmd = [sys.executable, str(ROOT / "scripts" / "replay_load.py"), recording,
+                   "--url", f"ws://127.0.0.1:{port}/ws", "--clients", str(n), "--speed", "0",
+                   "--out", str(work / f"load-{i}.json")]
+            if max_frames:
+                cmd += ["--max-frames", str(max_frames)]
+            loaders.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL))
+        for proc in loaders:
+            proc.wait()
+        reports = [json.loads(p.read_text()) for p in sorted(work.glob("load-*.json"))]
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+
+    elapsed = max(r["elapsed_sec"] for r in reports)
+    statuses = sum(r["statuses"] for r in reports)
+    return {
+        "workers": workers,
+        "clients": clients,
+        "statuses": statuses,
+        "elapsed_sec": elapsed,
+        "throughput_fps": round(statuses / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": max(r["status_latency_ms"]["p50"] for r in reports),
+        "p95_ms": max(r["status_latency_ms"]["p95"] for r in reports),
+        "failed_clients": sum(r["failed_clients"] for r in reports),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--load-procs", type=int, default=4, help="replay_load.py processes generating load")
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        result = run_one(args.recording, workers, args.clients, args.load_procs, args.port, args.max_frames)
+        results.append(result)
+        print(f"{workers} worker(s): {result['throughput_fps']:>8.1f} frames/s   "
+              f"p50 {result['p50_ms']:.1f} ms   p95 {result['p95_ms']:.1f} ms")
+
+    base = results[0]["throughput_fps"] or 1.0
+    print("\nworkers  frames/s  speedup")
+    for r in results:
+        print(f"{r['workers']:>7}  {r['throughput_fps']:>8.1f}  {r['throughput_fps'] / base:>6.2f}x")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"cpu_count": os.cpu_count(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Replay recorded camera sessions against /ws as N concurrent phones.
+
+Each simulated phone streams the recording's JPEG frames at the original
+pacing (scaled by --speed; 0 sends as fast as acks come back), sets the
+baseline and arms after --arm-after frames, and times every status reply
+against the frame it answers. Reports throughput, p50/p95/p99 status
+latency and alert timing.
+
+Record a session by starting the server with RECORD_DIR=./recordings, or
+synthesize one without a camera:
+  python scripts/replay_load.py --synthesize recordings/synthetic.edrec --frames 300
+
+Run against a local server with the stub detector:
+  VISION_BACKEND=stub GEMMA_ENABLED=false uvicorn server.main:app --port 8000 &
+  python scripts/replay_load.py recordings/synthetic.edrec --clients 8 --speed 4
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import ssl
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.recording import FrameRecorder, read_recording  # noqa: E402
+
+
+@dataclass
+class ClientResult:
+    frames_sent: int = 0
+    statuses: int = 0
+    latencies_ms: list[float] = field(default_factory=list)
+    alert_offsets_sec: list[float] = field(default_factory=list)
+    errors: int = 0
+
+
+def synthesize(path: str, frames: int, fps: float) -> None:
+    """Write a recording whose brightness steps down mid-way (a 'removed item' for StubCounter)."""
+    import cv2
+    import numpy as np
+
+    recorder = FrameRecorder(path)
+    for i in range(frames):
+        level = 200 if i < frames // 2 else 150
+        img = np.full((480, 640, 3), level, dtype=np.uint8)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        if ok:
+            recorder.write(int(i * 1000 / fps), buf.tobytes())
+    recorder.close()
+    print(f"Wrote {frames} frames to {path}")
+
+
+async def run_client(url: str, frames: list[tuple[int, str]], speed: float, arm_after: int,
+                     ssl_ctx: ssl.SSLContext | None) -> ClientResult:
+    import websockets
+
+    result = ClientResult()
+    sent_at: dict[int, float] = {}
+    started = time.perf_counter()
+
+    async with websockets.connect(url, ssl=ssl_ctx, max_size=None) as ws:
+        async def receive() -> None:
+            async for raw in ws:
+                msg = json.loads(raw)
+                now = time.perf_counter()
+                if msg.get("type") == "status":
+                    result.statuses += 1
+                    sent = sent_at.pop(msg.get("timestamp_ms"), None)
+                    if sent is not None:
+                        result.latencies_ms.append((now - sent) * 1000)
+                elif msg.get("type") == "alert":
+                    result.alert_offsets_sec.append(now - started)
+                elif msg.get("type") == "error":
+                    result.errors += 1
+
+        receiver = asyncio.create_task(receive())
+        first_ts = frames[0][0] if frames else 0
+        for i, (ts, jpeg_b64) in enumerate(frames):
+            if speed > 0:
+                due = started + (ts - first_ts) / 1000 / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # Unique per-frame timestamp so status replies can be matched.
+            stamp = int(time.time() * 1000) * 1000 + i % 1000
+            sent_at[stamp] = time.perf_counter()
+            await ws.send(json.dumps({"type": "frame", "timestamp_ms": stamp, "jpeg_b64": jpeg_b64}))
+            result.frames_sent += 1
+            if speed == 0:
+                # Closed loop: wait for the status of this frame before sending the next.
+                while stamp in sent_at and not receiver.done():
+                    await asyncio.sleep(0.001)
+            if i + 1 == arm_after:
+                await ws.send(json.dumps({"type": "command", "command": "set_baseline"}))
+                await ws.send(json.dumps({"type": "command", "command": "arm"}))
+
+        await asyncio.sleep(0.5)  # let trailing statuses arrive
+        receiver.cancel()
+    return result
+
+
+def _pct(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    frames = [(ts, base64.b64encode(jpeg).decode()) for ts, jpeg in read_recording(args.recording)]
+    if args.max_frames:
+        frames = frames[: args.max_frames]
+    ssl_ctx = None
+    if args.url.startswith("wss://"):
+        ssl_ctx = ssl.create_default_context()
+        if args.insecure:
+            ssl_ctx.check_hostname = False
+            ssl_ctx.verify_mode = ssl.CERT_NONE
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_client(args.url, frames, args.speed, args.arm_after, ssl_ctx) for _ in range(args.clients)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if isinstance(r, ClientResult)]
+    failed = [r for r in results if not isinstance(r, ClientResult)]
+    latencies = sorted(ms for r in ok for ms in r.latencies_ms)
+    first_alerts = [r.alert_offsets_sec[0] for r in ok if r.alert_offsets_sec]
+    report = {
+        "clients": args.clients,
+        "failed_clients": len(failed),
+        "frames_per_client": len(frames),
+        "elapsed_sec": round(elapsed, 2),
+        "frames_sent": sum(r.frames_sent for r in ok),
+        "statuses": sum(r.statuses for r in ok),
+        "throughput_fps": round(sum(r.statuses for r in ok) / elapsed, 2) if elapsed else 0.0,
+        "status_latency_ms": {
+            "p50": round(_pct(latencies, 0.50), 2),
+            "p95": round(_pct(latencies, 0.95), 2),
+            "p99": round(_pct(latencies, 0.99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "alerts": sum(len(r.alert_offsets_sec) for r in ok),
+        "first_alert_sec": {
+            "min": round(min(first_alerts), 2) if first_alerts else None,
+            "median": round(statistics.median(first_alerts), 2) if first_alerts else None,
+            "max": round(max(first_alerts), 2) if first_alerts else None,
+        },
+        "errors": sum(r.errors for r in ok),
+    }
+    print(json.dumps(report, indent=2))
+    for exc in failed[:3]:
+        print(f"client failed: {exc!r}", file=sys.stderr)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", nargs="?")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing multiplier; 0 = closed loop, no delay")
+    parser.add_argument("--arm-after", type=int, default=10, help="set baseline and arm after this many frames")
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--insecure", action="store_true", help="accept the self-signed cert (wss://)")
+    parser.add_argument("--out", default=None, help="also write the JSON report here")
+    parser.add_argument("--synthesize", metavar="PATH", help="write a synthetic recording and exit")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.synthesize:
+        synthesize(args.synthesize, args.frames, args.fps)
+        return
+    if not args.recording:
+        parser.error("recording path is required unless --synthesize is given")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
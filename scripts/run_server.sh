@@ -96,8 +96,15 @@ echo "└───────────────────────
 echo ""
 
 # ── Start server ───────────────────────────────────────────────────────────────
+# More than one worker needs state that every worker can see.
+WORKERS="${WORKERS:-1}"
+if [[ "$WORKERS" -gt 1 ]]; then
+  export STATE_BACKEND=shared
+fi
+
 exec uvicorn server.main:app \
   --host 0.0.0.0 \
   --port 8000 \
+  --workers "$WORKERS" \
   --ssl-keyfile certs/key.pem \
   --ssl-certfile certs/cert.pem
@@ -1,5 +1,10 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
 import httpx
 
 
@@ -15,15 +20,125 @@ def deterministic_alert_text(diff: int) -> str:
     return "Mr. Richard, cup count is unchanged."
 
 
+class AlertTextCache:
+    """LRU + TTL cache of alert sentences keyed by (baseline, observed, diff)."""
+
+    def __init__(self, max_size: int, ttl_sec: float):
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self._entries: OrderedDict[tuple[int, int, int], tuple[str, float, bool]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.prefetch_hits = 0
+
+    def get(self, key: tuple[int, int, int]) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            text, expires_at, from_prefetch = entry
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if from_prefetch:
+                # Count each prefetched sentence once, the first time it saves a round trip.
+                self.prefetch_hits += 1
+                self._entries[key] = (text, expires_at, False)
+            return text
+
+    def contains(self, key: tuple[int, int, int]) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() < entry[1]
+
+    def put(self, key: tuple[int, int, int], text: str, *, from_prefetch: bool = False) -> None:
+        with self._lock:
+            self._entries[key] = (text, time.monotonic() + self.ttl_sec, from_prefetch)
+            self._entries.move_to_end(key)
+            if from_prefetch:
+                self.prefetched += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "prefetched": self.prefetched,
+                "prefetch_hits": self.prefetch_hits,
+                "prefetch_effectiveness": (
+                    round(self.prefetch_hits / self.prefetched, 3) if self.prefetched else 0.0
+                ),
+            }
+
+
 class AlertAgent:
-    def __init__(self, ollama_base_url: str, ollama_model: str, timeout_sec: float):
+    def __init__(
+        self,
+        ollama_base_url: str,
+        ollama_model: str,
+        timeout_sec: float,
+        cache_size: int = 64,
+        cache_ttl_sec: float = 600.0,
+        prefetch_span: int = 3,
+    ):
         self.ollama_base_url = ollama_base_url.rstrip("/")
         self.ollama_model = ollama_model
         self.timeout_sec = timeout_sec
+        self.prefetch_span = prefetch_span
+        self.cache = AlertTextCache(max_size=cache_size, ttl_sec=cache_ttl_sec)
 
     def generate_alert_text(self, baseline_count: int, observed_count: int, diff: int) -> str:
+        if diff == 0:
+            return deterministic_alert_text(diff)
+
+        key = (baseline_count, observed_count, diff)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        text, from_llm = self._generate_uncached(baseline_count, observed_count, diff)
+        if from_llm:
+            # Fallbacks are not cached, so the next alert retries Ollama once it is back.
+            self.cache.put(key, text)
+        return text
+
+    def prefetch(self, baseline_count: int) -> None:
+        """Pre-generate the most likely alert sentences for a new baseline in the background."""
+        if self.prefetch_span <= 0:
+            return
+
+        def _run() -> None:
+            for magnitude in range(1, self.prefetch_span + 1):
+                for diff in (-magnitude, magnitude):
+                    observed = baseline_count + diff
+                    if observed < 0:
+                        continue
+                    key = (baseline_count, observed, diff)
+                    if self.cache.contains(key):
+                        continue
+                    text, from_llm = self._generate_uncached(baseline_count, observed, diff)
+                    if not from_llm:
+                        return  # Ollama is down or unusable; don't queue up more timeouts
+                    self.cache.put(key, text, from_prefetch=True)
+
+        threading.Thread(target=_run, daemon=True).start()
+
+    def cache_stats(self) -> dict[str, Any]:
+        return self.cache.stats()
+
+    def _generate_uncached(self, baseline_count: int, observed_count: int, diff: int) -> tuple[str, bool]:
+        """(text, from_llm): from_llm is False when the deterministic fallback was used."""
         # Hard fallback for exact phrasing requirements.
-        fallback = deterministic_alert_text(diff)
+        fallback = deterministic_alert_text(diff), False
         if diff == 0:
             return fallback
 
@@ -56,6 +171,6 @@ class AlertAgent:
                 return fallback
             if diff > 0 and "add" not in text.lower():
                 return fallback
-            return text
+            return text, True
         except Exception:
             return fallback
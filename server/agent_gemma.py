@@ -1,20 +1,33 @@
 """
 Fine-tuned Gemma agent for inventory function calling.
 
-Loads gemma-2-2b-it + QLoRA adapter and decides one of:
+Loads gemma-2-2b-it + QLoRA adapter (or, on CPU, the merged int8 artifact
+from finetune/build_cpu_artifact.py when present) and decides one of:
   - trigger_alert(severity, message)
   - ignore_event(reason)
   - rebaseline(new_count)
 
-Runs as a background thread so it never blocks the WebSocket loop.
+Runs on a single persistent worker thread so it never blocks the WebSocket
+loop. Pending requests are coalesced per session: only the latest scene of
+each session is kept, so stale decisions are dropped instead of queued.
+Requests from concurrent sessions that arrive within a short window share
+one left-padded, batched generate call.
 Falls back gracefully if model is not loaded.
 """
 from __future__ import annotations
 
+import asyncio
+import bisect
+import hashlib
+import json
+import os
 import re
 import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Callable
+from pathlib import Path
+from typing import Any, Sequence
 
 
 SYSTEM_PROMPT = (
@@ -27,6 +40,37 @@ SYSTEM_PROMPT = (
     "Call exactly one function. Reply with ONLY the function call."
 )
 
+ACTIONS = ("trigger_alert", "ignore_event", "rebaseline")
+
+# Constant system turn; its key/value cache is computed once after load().
+SYSTEM_PREFIX = f"<start_of_turn>system\n{SYSTEM_PROMPT}<end_of_turn>\n"
+
+
+def render_scene(
+    item_count: int,
+    baseline_count: int,
+    streak: int,
+    avg_conf: float,
+    history: Sequence[int],
+) -> str:
+    diff = item_count - baseline_count
+    return (
+        f"Cups visible: {item_count}\n"
+        f"Baseline: {baseline_count}\n"
+        f"Diff: {diff:+d}\n"
+        f"Streak: {streak} consecutive discrepant frames\n"
+        f"Confidence: {avg_conf:.2f}\n"
+        f"History: {[int(v) for v in history[-8:]]}"
+    )
+
+
+def render_turns(scene: str) -> str:
+    """Everything after SYSTEM_PREFIX: the user turn and the open model turn."""
+    return (
+        f"<start_of_turn>user\n{scene}<end_of_turn>\n"
+        f"<start_of_turn>model\n"
+    )
+
 
 @dataclass
 class GemmaDecision:
@@ -36,6 +80,7 @@ class GemmaDecision:
     reason: str | None     # for ignore_event
     new_count: int | None  # for rebaseline
     raw_output: str = ""
+    source: str = "gemma"  # "gemma" | "rules" (see cascade.DecisionCascade)
 
 
 def _parse_output(text: str, observed_count: int) -> GemmaDecision:
@@ -77,16 +122,297 @@ def _parse_output(text: str, observed_count: int) -> GemmaDecision:
     )
 
 
+# Grammars of the three valid calls, as segments matched left to right:
+# ("lit", s) literal text, ("choice", opts) one of several literals,
+# ("text",) a quoted string body without '"' or newlines, ("digits",) \d+.
+_CALL_GRAMMARS: tuple[tuple[tuple[Any, ...], ...], ...] = (
+    (
+        ("lit", 'trigger_alert(severity="'),
+        ("choice", ("low", "medium", "high")),
+        ("lit", '", message="'),
+        ("text",),
+        ("lit", '")'),
+    ),
+    (("lit", 'ignore_event(reason="'), ("text",), ("lit", '")')),
+    (("lit", "rebaseline(new_count="), ("digits",), ("lit", ")")),
+)
+
+
+def _match_segments(segments: tuple[tuple[Any, ...], ...], text: str, i: int = 0) -> str | None:
+    """Return "complete", "prefix" or None for text[i:] against segments."""
+    if not segments:
+        return "complete" if i == len(text) else None
+    if i == len(text):
+        return "prefix"
+
+    kind = segments[0][0]
+    rest = segments[1:]
+    if kind == "lit":
+        literal = segments[0][1]
+        chunk = text[i:i + len(literal)]
+        if not literal.startswith(chunk):
+            return None
+        if len(chunk) < len(literal):
+            return "prefix"
+        return _match_segments(rest, text, i + len(literal))
+    if kind == "choice":
+        best = None
+        for option in segments[0][1]:
+            result = _match_segments((("lit", option),) + rest, text, i)
+            if result == "complete":
+                return result
+            best = best or result
+        return best
+    if kind == "text":
+        j = i
+        while j < len(text) and text[j] not in '"\n':
+            j += 1
+        return _match_segments(rest, text, j)
+    if kind == "digits":
+        j = i
+        while j < len(text) and text[j].isdigit():
+            j += 1
+        if j == i:
+            return None
+        return _match_segments(rest, text, j)
+    return None
+
+
+def match_call(text: str) -> str | None:
+    """Classify text against the call grammars: "complete", "prefix" or None."""
+    text = text.lstrip()
+    best = None
+    for grammar in _CALL_GRAMMARS:
+        result = _match_segments(grammar, text)
+        if result == "complete":
+            return result
+        best = best or result
+    return best
+
+
+class CallGrammarProcessor:
+    """Logits processor that keeps greedy decoding inside the call grammars.
+
+    For each row the highest-scoring of the top_k candidates that keeps the
+    output a valid grammar prefix is the only token left unmasked. Candidates
+    must add text: special tokens (EOS, <end_of_turn>, pad) decode to nothing
+    and would otherwise end generation mid-call, so they are only allowed
+    once the call is complete. If no candidate fits, the row is left
+    unconstrained and the output will be counted as a parse failure.
+    """
+
+    def __init__(self, tokenizer: Any, prompt_len: int, top_k: int = 64):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.top_k = top_k
+        self.special_ids = set(getattr(tokenizer, "all_special_ids", ()))
+
+    def __call__(self, input_ids: Any, scores: Any) -> Any:
+        import torch
+
+        constrained = torch.full_like(scores, float("-inf"))
+        for row in range(scores.shape[0]):
+            generated = input_ids[row, self.prompt_len:].tolist()
+            so_far = self.tokenizer.decode(generated, skip_special_tokens=True)
+            if match_call(so_far) == "complete":
+                constrained[row] = scores[row]
+                continue
+            chosen = None
+            for candidate in scores[row].topk(self.top_k).indices.tolist():
+                if candidate in self.special_ids:
+                    continue
+                text = self.tokenizer.decode(generated + [candidate], skip_special_tokens=True)
+                if len(text) > len(so_far) and text.strip() and match_call(text) is not None:
+                    chosen = candidate
+                    break
+            if chosen is None:
+                constrained[row] = scores[row]
+            else:
+                constrained[row, chosen] = scores[row, chosen]
+        return constrained
+
+
+class CallCompleteCriteria:
+    """Stopping criterion: a row is done once its output is a complete call."""
+
+    def __init__(self, tokenizer: Any, prompt_len: int):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+
+    def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+        import torch
+
+        done = [
+            match_call(self.tokenizer.decode(row[self.prompt_len:], skip_special_tokens=True)) == "complete"
+            for row in input_ids.tolist()
+        ]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class DecisionCache:
+    """LRU of decisions keyed on a quantized scene signature.
+
+    Decoding is greedy, so the decision is a pure function of the rendered
+    scene. Streak and confidence are bucketed so near-identical frames of a
+    steady discrepancy share an entry; the default streak edges and confidence
+    step keep the SYSTEM_PROMPT thresholds (6, 20, 0.40) on bucket boundaries.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        streak_edges: tuple[int, ...] = (6, 13, 20),
+        conf_step: float = 0.05,
+        history_tail: int = 4,
+    ):
+        self.max_size = max_size
+        self.streak_edges = tuple(sorted(streak_edges))
+        self.conf_step = conf_step
+        self.history_tail = history_tail
+        self._entries: OrderedDict[tuple, tuple[GemmaDecision, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_sec = 0.0
+
+    def key(
+        self,
+        item_count: int,
+        baseline_count: int,
+        streak: int,
+        avg_conf: float,
+        history: Sequence[int],
+    ) -> tuple:
+        streak_bucket = bisect.bisect_right(self.streak_edges, streak)
+        conf_bucket = int(avg_conf / self.conf_step + 1e-9) if self.conf_step > 0 else avg_conf
+        tail = tuple(int(v) for v in history[-self.history_tail:]) if self.history_tail > 0 else ()
+        return (item_count, baseline_count, streak_bucket, conf_bucket, tail)
+
+    def get(self, key: tuple) -> GemmaDecision | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_sec += entry[1]
+            return entry[0]
+
+    def put(self, key: tuple, decision: GemmaDecision, inference_sec: float) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (decision, inference_sec)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "saved_inference_sec": round(self.saved_sec, 3),
+            }
+
+
+def adapter_fingerprint(adapter_path: str | Path) -> dict[str, Any] | None:
+    """Identify a LoRA adapter by its resolved path and a hash of its config and
+    weights, so a merged artifact can tell which adapter it was built from."""
+    root = Path(adapter_path).resolve()
+    files = sorted(
+        p for p in root.glob("adapter_*") if p.suffix in (".json", ".safetensors", ".bin") and p.is_file()
+    )
+    if not files:
+        return None
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(path.name.encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return {
+        "adapter_path": str(root),
+        "adapter_sha256": digest.hexdigest(),
+        "adapter_mtime": max(int(p.stat().st_mtime) for p in files),
+    }
+
+
+@dataclass
+class _DecisionRequest:
+    item_count: int
+    baseline_count: int
+    streak: int
+    avg_conf: float
+    history: list[int]  # tail frozen at enqueue; the caller's window keeps moving
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued_monotonic: float
+
+
+def _resolve(future: asyncio.Future, decision: GemmaDecision | None) -> None:
+    if not future.done():
+        future.set_result(decision)
+
+
+def _cancel(future: asyncio.Future) -> None:
+    if not future.done():
+        future.cancel()
+
+
 class GemmaAgent:
-    def __init__(self, base_model_id: str, adapter_path: str, hf_token: str | None):
+    def __init__(
+        self,
+        base_model_id: str,
+        adapter_path: str | None,
+        hf_token: str | None,
+        max_pending: int = 4,
+        decision_cache: DecisionCache | None = None,
+        reuse_prefix_cache: bool = True,
+        constrained_decoding: bool = True,
+        cpu_artifact_path: str | None = None,
+        batch_size: int = 4,
+        batch_window_ms: float = 20.0,
+        profiler: Any = None,
+    ):
         self.base_model_id = base_model_id
         self.adapter_path = adapter_path
         self.hf_token = hf_token
+        self.max_pending = max(1, max_pending)
+        self.decision_cache = decision_cache or DecisionCache(max_size=256)
+        self.reuse_prefix_cache = reuse_prefix_cache
+        self.max_new_tokens = 40
+        self.constrained_decoding = constrained_decoding
+        self.cpu_artifact_path = cpu_artifact_path
+        self.batch_size = max(1, batch_size)
+        self.batch_window_sec = max(0.0, batch_window_ms / 1000)
+        self.profiler = profiler  # profiling.ProfileCapture, to include worker time in captures
         self._model = None
         self._tokenizer = None
         self._lock = threading.Lock()
         self._loaded = False
         self._load_error: str | None = None
+        self._prefix_ids = None
+        self._prefix_cache = None
+        self._decisions = 0
+        self._tokens_generated = 0
+        self._parse_failures = 0
+
+        # Coalescing request queue: session_id -> latest pending request.
+        self._pending: OrderedDict[str, _DecisionRequest] = OrderedDict()
+        self._pending_cv = threading.Condition()
+        self._worker: threading.Thread | None = None
+        self._submitted = 0
+        self._completed = 0
+        self._dropped = 0
+        self._wait_total_sec = 0.0
+        self._wait_max_sec = 0.0
+        self._batches = 0
+        self._batched_requests = 0
 
     def load(self) -> bool:
         """Load model in background thread. Returns True if successful."""
@@ -98,23 +424,48 @@ class GemmaAgent:
         try:
             import torch
             from transformers import AutoTokenizer, AutoModelForCausalLM
-            from peft import PeftModel
 
-            print(f"[GemmaAgent] Loading {self.base_model_id} + adapter...")
             device = "mps" if torch.backends.mps.is_available() else "cpu"
+            artifact = self._cpu_artifact()
 
-            self._tokenizer = AutoTokenizer.from_pretrained(
-                self.adapter_path,
-                token=self.hf_token,
-            )
-            base = AutoModelForCausalLM.from_pretrained(
-                self.base_model_id,
-                token=self.hf_token,
-                torch_dtype=torch.bfloat16,
-                device_map=device,
-            )
-            self._model = PeftModel.from_pretrained(base, self.adapter_path)
+            if device == "cpu" and artifact is not None:
+                print(f"[GemmaAgent] Loading merged int8 artifact {artifact}...")
+                self._tokenizer = AutoTokenizer.from_pretrained(str(artifact.parent))
+                # Full pickled module written by finetune/build_cpu_artifact.py. Unpickling runs
+                # arbitrary code, so the artifact directory is trusted like the server's own
+                # code: _cpu_artifact() only accepts files owned by us and not writable by others.
+                self._model = torch.load(artifact, map_location="cpu", weights_only=False)
+            elif not self.adapter_path:
+                # Plain checkpoint without an adapter (e.g. a tiny model for evaluation).
+                print(f"[GemmaAgent] Loading {self.base_model_id} (no adapter)...")
+                self._tokenizer = AutoTokenizer.from_pretrained(self.base_model_id, token=self.hf_token)
+                self._model = AutoModelForCausalLM.from_pretrained(
+                    self.base_model_id,
+                    token=self.hf_token,
+                    torch_dtype=torch.bfloat16,
+                    device_map=device,
+                )
+            else:
+                from peft import PeftModel
+
+                print(f"[GemmaAgent] Loading {self.base_model_id} + adapter...")
+                self._tokenizer = AutoTokenizer.from_pretrained(
+                    self.adapter_path,
+                    token=self.hf_token,
+                )
+                base = AutoModelForCausalLM.from_pretrained(
+                    self.base_model_id,
+                    token=self.hf_token,
+                    torch_dtype=torch.bfloat16,
+                    device_map=device,
+                )
+                self._model = PeftModel.from_pretrained(base, self.adapter_path)
             self._model.eval()
+            self._tokenizer.padding_side = "left"  # batched generate needs left padding
+            if self._tokenizer.pad_token is None:
+                # Many small causal LMs ship without one; padding=True would raise.
+                self._tokenizer.pad_token = self._tokenizer.eos_token
+            self._build_prefix_cache()
             self._loaded = True
             print(f"[GemmaAgent] Ready on {device}")
             return True
@@ -124,6 +475,75 @@ class GemmaAgent:
             print(f"[GemmaAgent] Load failed: {e}")
             return False
 
+    def _cpu_artifact(self) -> Path | None:
+        """Path to a merged int8 model.pt built from this base model and the
+        current contents of adapter_path, if present."""
+        if not self.cpu_artifact_path:
+            return None
+        root = Path(self.cpu_artifact_path)
+        artifact = root / "model.pt"
+        manifest_path = root / "manifest.json"
+        if not artifact.exists() or not manifest_path.exists():
+            return None
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except (OSError, ValueError):
+            return None
+        built_for = manifest.get("base_model_id")
+        if built_for != self.base_model_id:
+            print(f"[GemmaAgent] Ignoring {artifact}: built for {built_for}, not {self.base_model_id}")
+            return None
+        current = adapter_fingerprint(self.adapter_path) if self.adapter_path else None
+        if current is None:
+            print(f"[GemmaAgent] Ignoring {artifact}: adapter {self.adapter_path} not found to verify it against")
+            return None
+        for key in ("adapter_path", "adapter_sha256"):
+            if manifest.get(key) != current[key]:
+                print(f"[GemmaAgent] Ignoring {artifact}: stale {key} (rebuild with finetune/build_cpu_artifact.py)")
+                return None
+        for path in (root, artifact):
+            st = path.stat()
+            if st.st_uid != os.getuid() or st.st_mode & 0o022:
+                print(f"[GemmaAgent] Ignoring {artifact}: {path} is writable by other users")
+                return None
+        return artifact
+
+    def _build_prefix_cache(self) -> None:
+        """Prefill SYSTEM_PREFIX once so each decision only prefills the scene."""
+        if not self.reuse_prefix_cache:
+            return
+        try:
+            import torch
+            from transformers import DynamicCache
+
+            ids = self._tokenizer(SYSTEM_PREFIX, return_tensors="pt").input_ids.to(self._model.device)
+            with torch.no_grad():
+                out = self._model(input_ids=ids, past_key_values=DynamicCache(), use_cache=True)
+            self._prefix_ids = ids
+            self._prefix_cache = out.past_key_values
+        except Exception as e:
+            self._prefix_ids = None
+            self._prefix_cache = None
+            print(f"[GemmaAgent] Prefix cache unavailable, prefilling full prompt: {e}")
+
+    def _encode(self, scene: str) -> dict[str, Any]:
+        import copy
+        import torch
+
+        turns = render_turns(scene)
+        if self.reuse_prefix_cache and self._prefix_cache is not None:
+            suffix_ids = self._tokenizer(
+                turns, add_special_tokens=False, return_tensors="pt"
+            ).input_ids.to(self._model.device)
+            input_ids = torch.cat([self._prefix_ids, suffix_ids], dim=1)
+            return {
+                "input_ids": input_ids,
+                "attention_mask": torch.ones_like(input_ids),
+                # generate() extends the cache in place, so each call gets its own copy.
+                "past_key_values": copy.deepcopy(self._prefix_cache),
+            }
+        return dict(self._tokenizer(SYSTEM_PREFIX + turns, return_tensors="pt").to(self._model.device))
+
     def load_async(self) -> None:
         """Start loading model in background thread."""
         t = threading.Thread(target=self.load, daemon=True)
@@ -139,60 +559,241 @@ class GemmaAgent:
         baseline_count: int,
         streak: int,
         avg_conf: float,
-        history: list[int],
+        history: Sequence[int],
     ) -> GemmaDecision | None:
         """Run inference. Returns None if model not ready."""
+        return self.decide_batch([(item_count, baseline_count, streak, avg_conf, history)])[0]
+
+    def decide_batch(self, scenes: list[tuple[int, int, int, float, Sequence[int]]]) -> list[GemmaDecision | None]:
+        """Decide several (item_count, baseline_count, streak, avg_conf, history) scenes.
+
+        Cached scenes are answered from the decision cache; the rest share one
+        batched generate call. Entries are None if the model is not ready or
+        inference failed.
+        """
         if not self._loaded:
-            return None
+            return [None] * len(scenes)
 
-        diff = item_count - baseline_count
-        scene = (
-            f"Cups visible: {item_count}\n"
-            f"Baseline: {baseline_count}\n"
-            f"Diff: {diff:+d}\n"
-            f"Streak: {streak} consecutive discrepant frames\n"
-            f"Confidence: {avg_conf:.2f}\n"
-            f"History: {history[-8:]}"
-        )
-        prompt = (
-            f"<start_of_turn>system\n{SYSTEM_PROMPT}<end_of_turn>\n"
-            f"<start_of_turn>user\n{scene}<end_of_turn>\n"
-            f"<start_of_turn>model\n"
-        )
+        results: list[GemmaDecision | None] = [None] * len(scenes)
+        misses: list[tuple[int, tuple]] = []
+        for i, scene in enumerate(scenes):
+            key = self.decision_cache.key(*scene)
+            cached = self.decision_cache.get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append((i, key))
+        if not misses:
+            return results
+
+        started = time.perf_counter()
+        decisions = self._generate_batch([scenes[i] for i, _ in misses])
+        per_scene_sec = (time.perf_counter() - started) / len(misses)
+        for (i, key), decision in zip(misses, decisions):
+            results[i] = decision
+            if decision is not None:
+                self.decision_cache.put(key, decision, per_scene_sec)
+        return results
+
+    def _generate_batch(self, scenes: list[tuple[int, int, int, float, Sequence[int]]]) -> list[GemmaDecision | None]:
+        if len(scenes) == 1:
+            return [self._generate_decision(*scenes[0])]
 
+        # Left-padded full prompts: the single-row SYSTEM_PREFIX cache is not
+        # shared across a padded batch.
+        prompts = [SYSTEM_PREFIX + render_turns(render_scene(*scene)) for scene in scenes]
         try:
             import torch
             with self._lock:
-                inputs = self._tokenizer(prompt, return_tensors="pt").to(self._model.device)
+                inputs = self._tokenizer(prompts, return_tensors="pt", padding=True).to(self._model.device)
+                prompt_len = inputs["input_ids"].shape[1]
                 with torch.no_grad():
                     out = self._model.generate(
                         **inputs,
-                        max_new_tokens=40,
+                        **self._constraint_kwargs(prompt_len),
+                        max_new_tokens=self.max_new_tokens,
                         do_sample=False,
                         temperature=1.0,
+                        pad_token_id=self._tokenizer.pad_token_id,
                     )
-                decoded = self._tokenizer.decode(
-                    out[0][inputs["input_ids"].shape[1]:],
-                    skip_special_tokens=True,
-                ).strip()
+                pad_id = self._tokenizer.pad_token_id
+                decisions: list[GemmaDecision | None] = []
+                for row, scene in zip(out, scenes):
+                    new_tokens = row[prompt_len:]
+                    decoded = self._tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+                    self._record_decode(int((new_tokens != pad_id).sum()), decoded)
+                    decisions.append(_parse_output(decoded, scene[0]))
+            return decisions
+        except Exception as e:
+            print(f"[GemmaAgent] Batched inference error: {e}")
+            return [None] * len(scenes)
+
+    def _generate_decision(
+        self,
+        item_count: int,
+        baseline_count: int,
+        streak: int,
+        avg_conf: float,
+        history: Sequence[int],
+    ) -> GemmaDecision | None:
+        scene = render_scene(item_count, baseline_count, streak, avg_conf, history)
+
+        try:
+            import torch
+            with self._lock:
+                inputs = self._encode(scene)
+                prompt_len = inputs["input_ids"].shape[1]
+                with torch.no_grad():
+                    out = self._model.generate(
+                        **inputs,
+                        **self._constraint_kwargs(prompt_len),
+                        max_new_tokens=self.max_new_tokens,
+                        do_sample=False,
+                        temperature=1.0,
+                    )
+                new_tokens = out[0][prompt_len:]
+                decoded = self._tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+            self._record_decode(len(new_tokens), decoded)
             return _parse_output(decoded, item_count)
         except Exception as e:
             print(f"[GemmaAgent] Inference error: {e}")
             return None
 
+    def _constraint_kwargs(self, prompt_len: int) -> dict[str, Any]:
+        if not self.constrained_decoding:
+            return {}
+        from transformers import LogitsProcessorList, StoppingCriteriaList
+
+        return {
+            "logits_processor": LogitsProcessorList([CallGrammarProcessor(self._tokenizer, prompt_len)]),
+            "stopping_criteria": StoppingCriteriaList([CallCompleteCriteria(self._tokenizer, prompt_len)]),
+        }
+
+    def _record_decode(self, tokens_generated: int, decoded: str) -> None:
+        with self._pending_cv:
+            self._decisions += 1
+            self._tokens_generated += tokens_generated
+            if match_call(decoded) != "complete":
+                self._parse_failures += 1
+
+    def decode_stats(self) -> dict[str, Any]:
+        with self._pending_cv:
+            return {
+                "decisions": self._decisions,
+                "avg_tokens_generated": (
+                    round(self._tokens_generated / self._decisions, 2) if self._decisions else 0.0
+                ),
+                "parse_failures": self._parse_failures,
+                "parse_failure_rate": (
+                    round(self._parse_failures / self._decisions, 3) if self._decisions else 0.0
+                ),
+            }
+
     def decide_async(
         self,
+        session_id: str,
         item_count: int,
         baseline_count: int,
         streak: int,
         avg_conf: float,
-        history: list[int],
-        callback: Callable[[GemmaDecision], Any],
-    ) -> None:
-        """Run inference in background thread, call callback with result."""
-        def _run():
-            decision = self.decide(item_count, baseline_count, streak, avg_conf, history)
-            if decision:
-                callback(decision)
-
-        threading.Thread(target=_run, daemon=True).start()
+        history: Sequence[int],
+    ) -> asyncio.Future:
+        """Queue a decision for the inference worker.
+
+        Must be called from a running event loop; the returned future resolves on
+        that loop with the decision (or None on error). A newer request for the
+        same session supersedes a pending one, whose future is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        request = _DecisionRequest(
+            item_count=item_count,
+            baseline_count=baseline_count,
+            streak=streak,
+            avg_conf=avg_conf,
+            history=[int(v) for v in history[-max(8, self.decision_cache.history_tail):]],
+            loop=loop,
+            future=loop.create_future(),
+            enqueued_monotonic=time.monotonic(),
+        )
+        dropped: list[_DecisionRequest] = []
+        with self._pending_cv:
+            self._ensure_worker()
+            self._submitted += 1
+            previous = self._pending.pop(session_id, None)
+            if previous is not None:
+                dropped.append(previous)
+            while len(self._pending) >= self.max_pending:
+                _, oldest = self._pending.popitem(last=False)
+                dropped.append(oldest)
+            self._pending[session_id] = request
+            self._dropped += len(dropped)
+            self._pending_cv.notify()
+
+        for stale in dropped:
+            stale.loop.call_soon_threadsafe(_cancel, stale.future)
+        return request.future
+
+    def queue_stats(self) -> dict[str, Any]:
+        with self._pending_cv:
+            return {
+                "pending": len(self._pending),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "dropped": self._dropped,
+                "avg_queue_wait_ms": (
+                    round(1000 * self._wait_total_sec / self._completed, 2) if self._completed else 0.0
+                ),
+                "max_queue_wait_ms": round(1000 * self._wait_max_sec, 2),
+                "batches": self._batches,
+                "avg_batch_size": round(self._batched_requests / self._batches, 2) if self._batches else 0.0,
+            }
+
+    def _ensure_worker(self) -> None:
+        # Caller holds self._pending_cv.
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._worker_loop, name="gemma-worker", daemon=True)
+            self._worker.start()
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._pending_cv:
+                while not self._pending:
+                    self._pending_cv.wait()
+                # Give concurrent sessions a short window to join this batch.
+                deadline = time.monotonic() + self.batch_window_sec
+                while len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._pending_cv.wait(remaining)
+                batch = [
+                    self._pending.popitem(last=False)[1]
+                    for _ in range(min(self.batch_size, len(self._pending)))
+                ]
+                now = time.monotonic()
+                for request in batch:
+                    waited = now - request.enqueued_monotonic
+                    self._wait_total_sec += waited
+                    self._wait_max_sec = max(self._wait_max_sec, waited)
+                self._batches += 1
+                self._batched_requests += len(batch)
+
+            scenes = [(r.item_count, r.baseline_count, r.streak, r.avg_conf, r.history) for r in batch]
+            try:
+                if self.profiler is not None:
+                    decisions = self.profiler.run_in_thread(lambda: self.decide_batch(scenes))
+                else:
+                    decisions = self.decide_batch(scenes)
+            except Exception as e:
+                # One bad batch (e.g. CUDA OOM) must not kill the worker and
+                # leave every later request waiting forever.
+                print(f"[GemmaAgent] Batch of {len(batch)} failed: {e}")
+                decisions = [None] * len(batch)
+            with self._pending_cv:
+                self._completed += len(batch)
+            for request, decision in zip(batch, decisions):
+                try:
+                    request.loop.call_soon_threadsafe(_resolve, request.future, decision)
+                except RuntimeError:
+                    # Event loop already closed (server shutting down).
+                    pass
@@ -0,0 +1,155 @@
+"""
+Precompressed, content-hashed static assets.
+
+At startup every file in static/ is read once and kept in memory as
+identity, gzip and (when the brotli package is installed) brotli variants.
+CSS/JS get a content-hashed URL (/static/phone.3f9a1c2b7e.js) that the HTML
+pages are rewritten to reference, so those can be cached as immutable. The
+HTML pages themselves keep their URLs and are revalidated with strong,
+per-encoding ETags, which costs a 304 and no body on reload.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+_MIN_COMPRESS_BYTES = 256
+_STATIC_REF = re.compile(r'(["\'])/static/([\w.-]+)\1')
+
+
+@dataclass
+class Asset:
+    name: str
+    media_type: str
+    digest: str
+    variants: dict[str, bytes] = field(default_factory=dict)  # encoding -> body; "identity" always present
+
+    @property
+    def hashed_name(self) -> str:
+        stem, dot, suffix = self.name.rpartition(".")
+        return f"{stem}.{self.digest}.{suffix}" if dot else f"{self.name}.{self.digest}"
+
+
+def _variants(body: bytes) -> dict[str, bytes]:
+    variants = {"identity": body}
+    if len(body) < _MIN_COMPRESS_BYTES:
+        return variants
+    gz = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(gz) < len(body):
+        variants["gzip"] = gz
+    if brotli is not None:
+        br = brotli.compress(body, quality=11)
+        if len(br) < len(body):
+            variants["br"] = br
+    return variants
+
+
+def _accepted(header: str) -> dict[str, float]:
+    accepted: dict[str, float] = {}
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def _link_hashed(html: bytes, assets: dict[str, Asset]) -> bytes:
+    """Point "/static/x.css" references at the hashed name of x.css."""
+    def swap(match: re.Match) -> str:
+        quote, name = match.groups()
+        asset = assets.get(name)
+        return f"{quote}/static/{asset.hashed_name if asset else name}{quote}"
+
+    return _STATIC_REF.sub(swap, html.decode("utf-8")).encode("utf-8")
+
+
+class AssetBundle:
+    def __init__(self, static_dir: str | Path):
+        self.static_dir = Path(static_dir)
+        self._assets: dict[str, Asset] = {}  # plain and hashed names -> asset
+        self._immutable: set[str] = set()
+        self.build()
+
+    def build(self) -> None:
+        files = sorted(p for p in self.static_dir.iterdir() if p.is_file() and not p.name.startswith("."))
+        # Subresources first, so pages can be rewritten to their hashed names.
+        files.sort(key=lambda p: p.suffix == ".html")
+        assets: dict[str, Asset] = {}
+        immutable: set[str] = set()
+        for path in files:
+            body = path.read_bytes()
+            if path.suffix == ".html":
+                body = _link_hashed(body, assets)
+            media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+                media_type += "; charset=utf-8"
+            asset = Asset(
+                name=path.name,
+                media_type=media_type,
+                digest=hashlib.sha256(body).hexdigest()[:10],
+                variants=_variants(body),
+            )
+            assets[asset.name] = asset
+            if path.suffix != ".html":
+                assets[asset.hashed_name] = asset
+                immutable.add(asset.hashed_name)
+        self._assets = assets
+        self._immutable = immutable
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._assets
+
+    def response(self, name: str, request: Request) -> Response:
+        """The best encoding the client accepts, or 304 if its cached copy is current."""
+        asset = self._assets.get(name)
+        if asset is None:
+            return Response(status_code=404)
+        accepted = _accepted(request.headers.get("accept-encoding", ""))
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and accepted.get(candidate, accepted.get("*", 0.0)) > 0:
+                encoding = candidate
+                break
+        body = asset.variants[encoding]
+        headers = {
+            "ETag": f'"{asset.digest}-{encoding}"',
+            "Cache-Control": IMMUTABLE if name in self._immutable else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if_none_match = request.headers.get("if-none-match", "")
+        if headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            asset.name: {encoding: len(body) for encoding, body in asset.variants.items()}
+            for name, asset in self._assets.items()
+            if name == asset.name
+        }
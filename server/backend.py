@@ -0,0 +1,148 @@
+"""
+Where the inventory state lives, so /ws and /ws/dashboard can be served by
+several uvicorn workers.
+
+memory  the state machine is an ordinary object in this process. Only
+        correct with a single worker; no locking or copying.
+shared  the state machine fields live in a small mmap'd file guarded by
+        flock. Every mutation is a transaction: lock, load into a fresh
+        InventoryStateMachine, apply, store, unlock. The cooldown deadline
+        is stored as time.monotonic(), which is CLOCK_MONOTONIC on Linux and
+        therefore comparable across processes on the same host.
+
+        state.bin outlives the server, so its contents only count as live
+        if another worker is still running: every worker holds a shared
+        flock on live.lock for its lifetime, and a worker that can take it
+        exclusively at startup is the first of a new launch. It resets the
+        shared state (fresh=True) so the checkpoint, not a previous run's
+        leftovers, is what gets restored.
+"""
+from __future__ import annotations
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from .state import InventoryStateMachine, SystemState
+
+BACKENDS = ("memory", "shared")
+
+_STATES = list(SystemState)
+# revision, state, has_baseline, baseline, has_last, last, streak, cooldown_until_monotonic
+_LAYOUT = struct.Struct("<qBBiBiid")
+
+
+class StateBackend:
+    name = ""
+    fresh = True  # False when attaching to state a running worker already holds
+
+    @contextmanager
+    def transaction(self) -> Iterator[InventoryStateMachine]:
+        """Yield the state machine for mutation; changes are visible to all workers on exit."""
+        raise NotImplementedError
+        yield
+
+    def view(self) -> InventoryStateMachine:
+        """Current state for read-only use (status payloads, health)."""
+        raise NotImplementedError
+
+
+class InProcessStateBackend(StateBackend):
+    name = "memory"
+
+    def __init__(self, machine: InventoryStateMachine):
+        self.machine = machine
+
+    @contextmanager
+    def transaction(self) -> Iterator[InventoryStateMachine]:
+        yield self.machine
+
+    def view(self) -> InventoryStateMachine:
+        return self.machine
+
+
+class SharedStateBackend(StateBackend):
+    name = "shared"
+
+    def __init__(self, directory: str | Path, debounce_k: int, cooldown_sec: int, smoothing: str = "none"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.debounce_k = debounce_k
+        self.cooldown_sec = cooldown_sec
+        self.smoothing = smoothing
+        # flock only excludes other processes; threads of this one share the fd.
+        self._thread_lock = threading.Lock()
+        self._lock_fd = os.open(self.directory / "state.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        # Never closed: the kernel drops the flock when this process exits.
+        self._live_fd = os.open(self.directory / "live.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            try:
+                fcntl.flock(self._live_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                first_live = True
+            except BlockingIOError:
+                first_live = False
+            # Converting EX to SH is not atomic, but state.lock keeps other starters out meanwhile.
+            fcntl.flock(self._live_fd, fcntl.LOCK_SH)
+            fd = os.open(self.directory / "state.bin", os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                self.fresh = first_live or os.fstat(fd).st_size < _LAYOUT.size
+                if os.fstat(fd).st_size < _LAYOUT.size:
+                    os.ftruncate(fd, _LAYOUT.size)
+                self._map = mmap.mmap(fd, _LAYOUT.size)
+            finally:
+                os.close(fd)
+            if self.fresh:
+                self._store(self._new_machine())
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._thread_lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _new_machine(self) -> InventoryStateMachine:
+        return InventoryStateMachine(self.debounce_k, self.cooldown_sec, smoothing=self.smoothing)
+
+    def _load(self) -> InventoryStateMachine:
+        revision, state, has_baseline, baseline, has_last, last, streak, cooldown_until = _LAYOUT.unpack_from(self._map)
+        machine = self._new_machine()
+        machine.revision = revision
+        machine.state = _STATES[state]
+        machine.baseline_count = baseline if has_baseline else None
+        machine.last_observed_count = last if has_last else None
+        machine.discrepancy_streak = streak
+        machine.cooldown_until_monotonic = cooldown_until
+        return machine
+
+    def _store(self, machine: InventoryStateMachine) -> None:
+        _LAYOUT.pack_into(
+            self._map,
+            0,
+            machine.revision,
+            _STATES.index(machine.state),
+            machine.baseline_count is not None,
+            machine.baseline_count or 0,
+            machine.last_observed_count is not None,
+            machine.last_observed_count or 0,
+            machine.discrepancy_streak,
+            machine.cooldown_until_monotonic,
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator[InventoryStateMachine]:
+        with self._locked():
+            machine = self._load()
+            yield machine
+            self._store(machine)
+
+    def view(self) -> InventoryStateMachine:
+        with self._locked():
+            return self._load()
@@ -0,0 +1,199 @@
+"""
+Offline backtesting of InventoryStateMachine debounce/cooldown parameters.
+
+Given a recorded count sequence (timestamps, observed counts, baseline per
+frame), simulate the ARMED/COOLDOWN logic for a grid of (debounce_k,
+cooldown_sec) values and score each against "real" discrepancies.
+
+The simulation is event-driven over NumPy arrays and reproduces
+InventoryStateMachine.evaluate exactly:
+  - while ARMED the streak is the run of consecutive diff != 0 frames since
+    the state machine was (re)armed; it alerts when the streak reaches k
+  - an alert enters COOLDOWN until t_alert + cooldown_sec; the first frame
+    with t >= that deadline is evaluated as ARMED again with a fresh streak
+so alerts are found with searchsorted jumps instead of per-frame Python.
+With COUNT_SMOOTHING enabled the live machine compares the window's
+smoothed count, not the raw one, to the baseline; decision_diffs() replays
+the same RollingWindow over the segment once so simulate() sees the same
+diffs. simulate_online() runs the real class on the same input for
+verification.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Iterable
+from unittest import mock
+
+import numpy as np
+
+from .rolling import SMOOTHING_METHODS, RollingWindow
+from .state import InventoryStateMachine
+
+
+@dataclass
+class CountSeries:
+    """One armed segment: a fixed baseline and the counts observed while armed."""
+
+    ts_sec: np.ndarray   # float64, non-decreasing
+    counts: np.ndarray   # int64
+    baseline: int
+
+    @property
+    def diffs(self) -> np.ndarray:
+        return self.counts - self.baseline
+
+
+def discrepancy_runs(diffs: np.ndarray) -> np.ndarray:
+    """run[t] = number of consecutive frames ending at t with diff != 0."""
+    nonzero = diffs != 0
+    idx = np.arange(len(diffs))
+    last_zero = np.maximum.accumulate(np.where(~nonzero, idx, -1))
+    return np.where(nonzero, idx - last_zero, 0)
+
+
+def decision_diffs(series: CountSeries, smoothing: str = "none", window: int = 20) -> np.ndarray:
+    """Per-frame diff the state machine acts on: raw, or smoothed over a
+    RollingWindow that starts with the segment (as a fresh session would)."""
+    if smoothing not in SMOOTHING_METHODS:
+        raise ValueError(f"smoothing must be one of {SMOOTHING_METHODS}")
+    if smoothing == "none":
+        return series.diffs
+    rolling = RollingWindow(window)
+    smoothed = np.empty(len(series.counts), dtype=np.int64)
+    for i, count in enumerate(series.counts.tolist()):
+        rolling.push(count, 0.0)
+        smoothed[i] = rolling.smoothed_count(smoothing)
+    return smoothed - series.baseline
+
+
+def simulate(
+    series: CountSeries,
+    debounce_k: int,
+    cooldown_sec: float,
+    runs: np.ndarray | None = None,
+    smoothing: str = "none",
+    window: int = 20,
+) -> np.ndarray:
+    """Frame indices at which the state machine alerts, starting ARMED at frame 0.
+    `runs` (from discrepancy_runs(decision_diffs(...))) can be passed to reuse it across a sweep."""
+    if runs is None:
+        runs = discrepancy_runs(decision_diffs(series, smoothing, window))
+    candidates = np.flatnonzero(runs >= debounce_k)
+    n = len(series.counts)
+    alerts: list[int] = []
+    armed_at = 0
+    while armed_at < n:
+        # Streak at t is min(runs[t], t - armed_at + 1); it reaches k first at
+        # the earliest candidate t >= armed_at + k - 1.
+        pos = np.searchsorted(candidates, armed_at + debounce_k - 1)
+        if pos == len(candidates):
+            break
+        alert = int(candidates[pos])
+        alerts.append(alert)
+        armed_at = int(np.searchsorted(series.ts_sec, series.ts_sec[alert] + cooldown_sec, side="left"))
+        armed_at = max(armed_at, alert + 1)
+    return np.asarray(alerts, dtype=np.int64)
+
+
+def simulate_online(
+    series: CountSeries, debounce_k: int, cooldown_sec: float, smoothing: str = "none", window: int = 20
+) -> np.ndarray:
+    """Reference: drive the real InventoryStateMachine and RollingWindow with a fake clock."""
+    sm = InventoryStateMachine(debounce_k=debounce_k, cooldown_sec=cooldown_sec, smoothing=smoothing)
+    rolling = RollingWindow(window)
+    sm.on_stream_started()
+    sm.set_baseline(series.baseline)
+    sm.arm()
+    alerts = []
+    with mock.patch("server.state.time.monotonic") as clock:
+        for i, (t, count) in enumerate(zip(series.ts_sec, series.counts)):
+            clock.return_value = float(t)
+            rolling.push(int(count), 0.0)
+            if sm.evaluate(int(count), rolling).should_alert:
+                alerts.append(i)
+    return np.asarray(alerts, dtype=np.int64)
+
+
+def true_events(series: CountSeries, min_duration_sec: float) -> list[tuple[int, int]]:
+    """(start, end) index pairs of discrepancy runs lasting at least min_duration_sec."""
+    nonzero = np.concatenate([[False], series.diffs != 0, [False]])
+    edges = np.flatnonzero(np.diff(nonzero.astype(np.int8)))
+    events = []
+    for start, stop in zip(edges[::2], edges[1::2]):
+        end = stop - 1
+        if series.ts_sec[end] - series.ts_sec[start] >= min_duration_sec:
+            events.append((int(start), int(end)))
+    return events
+
+
+def score(series_list: list[CountSeries], alerts_list: list[np.ndarray], min_duration_sec: float) -> dict[str, Any]:
+    total_alerts = false_alerts = detected = n_events = 0
+    delays: list[float] = []
+    for series, alerts in zip(series_list, alerts_list):
+        events = true_events(series, min_duration_sec)
+        n_events += len(events)
+        in_event = np.zeros(len(series.counts), dtype=bool)
+        for start, end in events:
+            in_event[start:end + 1] = True
+            hits = alerts[(alerts >= start) & (alerts <= end)]
+            if len(hits):
+                detected += 1
+                delays.append(float(series.ts_sec[hits[0]] - series.ts_sec[start]))
+        total_alerts += len(alerts)
+        false_alerts += int((~in_event[alerts]).sum()) if len(alerts) else 0
+
+    delays_arr = np.asarray(delays)
+    return {
+        "alerts": total_alerts,
+        "false_alerts": false_alerts,
+        "false_alert_rate": round(false_alerts / total_alerts, 4) if total_alerts else 0.0,
+        "true_events": n_events,
+        "detected": detected,
+        "missed": n_events - detected,
+        "delay_mean_sec": round(float(delays_arr.mean()), 3) if len(delays_arr) else None,
+        "delay_p95_sec": round(float(np.percentile(delays_arr, 95)), 3) if len(delays_arr) else None,
+    }
+
+
+def sweep(
+    series_list: list[CountSeries],
+    debounce_values: Iterable[int],
+    cooldown_values: Iterable[float],
+    min_duration_sec: float = 2.0,
+    smoothing: str = "none",
+    window: int = 20,
+) -> list[dict[str, Any]]:
+    runs = [discrepancy_runs(decision_diffs(s, smoothing, window)) for s in series_list]
+    results = []
+    for k in debounce_values:
+        for cooldown in cooldown_values:
+            alerts = [simulate(s, k, cooldown, r) for s, r in zip(series_list, runs)]
+            results.append({"debounce_k": k, "cooldown_sec": cooldown, **score(series_list, alerts, min_duration_sec)})
+    return results
+
+
+def series_from_observations(rows: Iterable[dict[str, Any]]) -> list[CountSeries]:
+    """Split observation rows (oldest first) into armed segments with a constant baseline."""
+    from datetime import datetime
+
+    segments: list[CountSeries] = []
+    ts: list[float] = []
+    counts: list[int] = []
+    baseline: int | None = None
+
+    def flush() -> None:
+        if baseline is not None and counts:
+            segments.append(CountSeries(np.asarray(ts, dtype=np.float64), np.asarray(counts, dtype=np.int64), baseline))
+
+    for row in rows:
+        armed = str(row["state"]).rsplit(".", 1)[-1] in ("ARMED", "COOLDOWN")
+        if not armed or row["baseline_count"] is None or row["baseline_count"] != baseline:
+            flush()
+            ts, counts = [], []
+            baseline = row["baseline_count"] if armed else None
+            if baseline is None:
+                continue
+        ts.append(datetime.fromisoformat(row["ts_utc"]).timestamp())
+        counts.append(int(row["item_count"]))
+    flush()
+    return segments
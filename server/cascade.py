@@ -0,0 +1,164 @@
+"""
+Rule-first decision cascade in front of GemmaAgent.
+
+The SYSTEM_PROMPT decision rules are evaluated exactly; only borderline
+scenes (near a threshold, oscillating history, or outside the rules) are
+escalated to the model. For escalated scenes the rule answer is compared
+with the model's to track how often the two tiers agree. While Gemma is
+still loading, borderline scenes take the rule answer too, and scenes
+outside the rules get no decision. With GEMMA_ENABLED=false the whole
+cascade is off: its decisions are reported and logged as agent (gemma_*)
+decisions, which such deployments opted out of.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from dataclasses import replace
+from typing import Any, Sequence
+
+from .agent_gemma import GemmaAgent, _parse_output
+from .metrics import Metrics
+
+# Thresholds mirrored from SYSTEM_PROMPT.
+ALERT_MIN_STREAK = 6
+REBASELINE_MIN_STREAK = 20
+MIN_CONF = 0.40
+
+
+def rule_call(item_count: int, baseline_count: int, streak: int, avg_conf: float) -> str | None:
+    """Function call the decision rules prescribe, or None when they do not apply."""
+    diff = item_count - baseline_count
+    if streak >= REBASELINE_MIN_STREAK:
+        # Low-confidence long streaks are not covered by the rules.
+        return f"rebaseline(new_count={item_count})" if avg_conf >= MIN_CONF else None
+    if avg_conf < MIN_CONF:
+        return f'ignore_event(reason="Confidence too low ({avg_conf:.2f}). Detection unreliable.")'
+    if streak < ALERT_MIN_STREAK or diff == 0:
+        return f'ignore_event(reason="Only {streak} discrepant frames. Waiting for confirmation.")'
+
+    n = abs(diff)
+    item = "cup" if n == 1 else "cups"
+    direction = "removed" if diff < 0 else "added"
+    severity = "high" if n > 1 or streak > 12 else "medium"
+    return (
+        f'trigger_alert(severity="{severity}", '
+        f'message="Mr. Richard, {n} {item} {direction} from staging area.")'
+    )
+
+
+class DecisionCascade:
+    def __init__(
+        self,
+        gemma: GemmaAgent,
+        enabled: bool = True,
+        gemma_enabled: bool = True,
+        streak_margin: int = 1,
+        conf_margin: float = 0.05,
+        oscillation_flips: int = 3,
+        metrics: Metrics | None = None,
+    ):
+        self.gemma = gemma
+        self.enabled = enabled
+        self.gemma_enabled = gemma_enabled
+        self.metrics = metrics
+        self.streak_margin = streak_margin
+        self.conf_margin = conf_margin
+        self.oscillation_flips = oscillation_flips
+        self._lock = threading.Lock()
+        self._rule_resolved = 0
+        self._escalated = 0
+        self._compared = 0
+        self._agreed = 0
+        self._unresolved = 0
+
+    @property
+    def gemma_available(self) -> bool:
+        return self.gemma_enabled and self.gemma.is_ready
+
+    @property
+    def available(self) -> bool:
+        """Whether to call decide_async: the agent is enabled and the rule tier or Gemma can answer."""
+        return self.gemma_enabled and (self.enabled or self.gemma.is_ready)
+
+    def is_borderline(self, streak: int, avg_conf: float, history: Sequence[int]) -> bool:
+        for threshold in (ALERT_MIN_STREAK, REBASELINE_MIN_STREAK):
+            if abs(streak - threshold) <= self.streak_margin:
+                return True
+        if abs(avg_conf - MIN_CONF) <= self.conf_margin:
+            return True
+        tail = history[-8:]
+        flips = sum(1 for prev, cur in zip(tail, tail[1:]) if prev != cur)
+        return flips >= self.oscillation_flips
+
+    def decide_async(
+        self,
+        session_id: str,
+        item_count: int,
+        baseline_count: int,
+        streak: int,
+        avg_conf: float,
+        history: Sequence[int],
+    ) -> asyncio.Future:
+        """Resolve clear-cut scenes by rule, escalate the rest to GemmaAgent.
+
+        Same contract as GemmaAgent.decide_async: must be called from a running
+        event loop and returns a future of GemmaDecision | None.
+        """
+        call = rule_call(item_count, baseline_count, streak, avg_conf)
+        escalate = self.gemma_available and (
+            not self.enabled or call is None or self.is_borderline(streak, avg_conf, history)
+        )
+        if not escalate:
+            future = asyncio.get_running_loop().create_future()
+            if call is None or not self.enabled:
+                with self._lock:
+                    self._unresolved += 1
+                future.set_result(None)
+                return future
+            with self._lock:
+                self._rule_resolved += 1
+            self._count("cascade_rule")
+            future.set_result(replace(_parse_output(call, item_count), source="rules"))
+            return future
+
+        with self._lock:
+            self._escalated += 1
+        self._count("cascade_gemma")
+        future = self.gemma.decide_async(
+            session_id=session_id,
+            item_count=item_count,
+            baseline_count=baseline_count,
+            streak=streak,
+            avg_conf=avg_conf,
+            history=history,
+        )
+        if call is not None:
+            rule_action = call.split("(", 1)[0]
+            future.add_done_callback(lambda f: self._record_agreement(rule_action, f))
+        return future
+
+    def _count(self, name: str) -> None:
+        if self.metrics is not None:
+            self.metrics.inc(name)
+
+    def _record_agreement(self, rule_action: str, future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None or future.result() is None:
+            return
+        with self._lock:
+            self._compared += 1
+            if future.result().action == rule_action:
+                self._agreed += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._rule_resolved + self._escalated
+            return {
+                "rule_resolved": self._rule_resolved,
+                "escalated": self._escalated,
+                "escalation_rate": round(self._escalated / total, 3) if total else 0.0,
+                "unresolved": self._unresolved,
+                "compared": self._compared,
+                "agreed": self._agreed,
+                "agreement_rate": round(self._agreed / self._compared, 3) if self._compared else 0.0,
+            }
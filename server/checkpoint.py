@@ -0,0 +1,123 @@
+"""
+Crash-safe checkpoints of inventory state for warm restarts.
+
+The frame path only hands over a small dict when the state machine's
+revision changed or the periodic interval elapsed; a background thread
+serializes the newest pending snapshot and replaces the checkpoint file
+atomically (write temp file, fsync, os.replace), so a crash mid-write
+leaves the previous checkpoint intact.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+CHECKPOINT_VERSION = 1
+
+
+def load_checkpoint(path: str | Path) -> dict[str, Any] | None:
+    """Return the saved snapshot, or None if there is none or it is unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[Checkpoint] Ignoring unreadable {path}: {e}")
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        print(f"[Checkpoint] Ignoring {path}: version {data.get('version')}")
+        return None
+    return data
+
+
+class Checkpointer:
+    def __init__(self, path: str | Path, interval_sec: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.interval_sec = interval_sec
+        self._cv = threading.Condition()
+        self._pending: dict[str, Any] | None = None
+        self._closed = False
+        self._last_revision: int | None = None
+        self._next_periodic = 0.0
+        self.writes = 0
+        self.errors = 0
+        self.last_write_ms = 0.0
+        self.last_saved_at = 0.0
+        self._thread = threading.Thread(target=self._run, name="state-checkpoint", daemon=True)
+        self._thread.start()
+
+    def maybe_submit(self, revision: int, build: Callable[[], dict[str, Any]]) -> bool:
+        """Queue build() if `revision` changed or the interval elapsed. Cheap otherwise."""
+        now = time.monotonic()
+        if revision == self._last_revision and now < self._next_periodic:
+            return False
+        self._last_revision = revision
+        self._next_periodic = now + self.interval_sec
+        self.submit(build())
+        return True
+
+    def submit(self, snapshot: dict[str, Any]) -> None:
+        """Hand a snapshot to the writer; an unwritten older one is superseded."""
+        with self._cv:
+            self._pending = snapshot
+            self._cv.notify()
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Write whatever is pending and stop the writer thread."""
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while self._pending is None and not self._closed:
+                    self._cv.wait()
+                snapshot, self._pending = self._pending, None
+                closed = self._closed
+            if snapshot is not None:
+                self._write(snapshot)
+            if closed:
+                return
+
+    def _write(self, snapshot: dict[str, Any]) -> None:
+        started = time.perf_counter()
+        saved_at = time.time()
+        # Per-process temp name: several workers may checkpoint the same shared state.
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": CHECKPOINT_VERSION, "saved_at": saved_at, **snapshot}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            if hasattr(os, "O_DIRECTORY"):
+                # Persist the rename itself, not just the file contents.
+                dir_fd = os.open(self.path.parent, os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+        except OSError as e:
+            self.errors += 1
+            print(f"[Checkpoint] Write to {self.path} failed: {e}")
+            return
+        self.writes += 1
+        self.last_saved_at = saved_at
+        self.last_write_ms = (time.perf_counter() - started) * 1000
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "writes": self.writes,
+            "errors": self.errors,
+            "last_write_ms": round(self.last_write_ms, 2),
+            "age_sec": round(time.time() - self.last_saved_at, 1) if self.last_saved_at else None,
+        }
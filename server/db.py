@@ -4,7 +4,7 @@ import json
 import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 
 class EventDB:
@@ -103,3 +103,16 @@ class EventDB:
             ).fetchall()
 
         return [dict(row) for row in rows]
+
+    def iter_observations(self, since_id: int = 0) -> Iterator[dict[str, Any]]:
+        """Stream observations oldest first (for offline backtesting)."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                SELECT id, ts_utc, state, item_count, baseline_count, diff, avg_conf, streak
+                FROM observations WHERE id > ? ORDER BY id ASC
+                """,
+                (since_id,),
+            )
+            for row in cursor:
+                yield dict(row)
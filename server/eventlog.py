@@ -0,0 +1,260 @@
+"""
+Append-only, typed log of inventory state changes with time-travel queries.
+
+Every entry has typed columns (kind, session, state, baseline_count,
+observed_count, diff, streak, cooldown_until_ms) holding the system state
+right after the event, plus a small JSON detail for kind-specific fields
+(alert message, Gemma action, ...). Every `snapshot_every`-th entry also
+writes a snapshot of the folded state, so state_at(ts) loads the nearest
+snapshot at or before ts and replays at most `snapshot_every` entries:
+query cost does not grow with history length.
+
+Lives in the same SQLite file as EventDB; the events/observations tables
+are left as they are.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+KINDS = (
+    "transition",      # state machine moved to a new state on a frame
+    "baseline",        # set_baseline
+    "arm",
+    "disarm",
+    "reset",
+    "alert",
+    "gemma_decision",
+    "restored",        # state restored from a checkpoint on boot
+)
+
+
+@dataclass
+class LogEntry:
+    kind: str
+    state: str | None = None
+    baseline_count: int | None = None
+    observed_count: int | None = None
+    diff: int | None = None
+    streak: int | None = None
+    cooldown_until_ms: int | None = None
+    session: str | None = None
+    detail: dict[str, Any] = field(default_factory=dict)
+    ts_ms: int = 0  # stamped by append(); see there
+
+
+def empty_state() -> dict[str, Any]:
+    return {
+        "event_id": 0,
+        "ts_ms": None,
+        "state": "IDLE",
+        "baseline_count": None,
+        "observed_count": None,
+        "diff": 0,
+        "streak": 0,
+        "cooldown_until_ms": 0,
+        "session": None,
+        "alerts": 0,
+        "last_alert": None,
+        "last_decision": None,
+    }
+
+
+def apply(state: dict[str, Any], event_id: int, entry: LogEntry) -> dict[str, Any]:
+    """Fold one entry into a state dict (returns a new dict)."""
+    state = dict(state)
+    state["event_id"] = event_id
+    state["ts_ms"] = entry.ts_ms
+    for key in ("state", "observed_count", "diff", "streak", "cooldown_until_ms", "session"):
+        value = getattr(entry, key)
+        if value is not None:
+            state[key] = value
+    if entry.kind == "reset":
+        state["baseline_count"] = None
+    elif entry.baseline_count is not None:
+        state["baseline_count"] = entry.baseline_count
+    if entry.kind == "alert":
+        state["alerts"] += 1
+        state["last_alert"] = {"ts_ms": entry.ts_ms, "diff": entry.diff, **entry.detail}
+    elif entry.kind == "gemma_decision":
+        state["last_decision"] = {"ts_ms": entry.ts_ms, **entry.detail}
+    return state
+
+
+_INSERT_COLUMNS = "ts_ms, kind, session, state, baseline_count, observed_count, diff, streak, cooldown_until_ms, detail_json"
+_COLUMNS = f"id, {_INSERT_COLUMNS}"
+
+
+def _entry_from_row(row: sqlite3.Row) -> LogEntry:
+    return LogEntry(
+        kind=row["kind"],
+        state=row["state"],
+        baseline_count=row["baseline_count"],
+        observed_count=row["observed_count"],
+        diff=row["diff"],
+        streak=row["streak"],
+        cooldown_until_ms=row["cooldown_until_ms"],
+        session=row["session"],
+        detail=json.loads(row["detail_json"]) if row["detail_json"] else {},
+        ts_ms=row["ts_ms"],
+    )
+
+
+class StateLog:
+    def __init__(self, db_path: str, snapshot_every: int = 256):
+        self.db_path = db_path
+        self.snapshot_every = max(1, snapshot_every)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS state_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts_ms INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    session TEXT,
+                    state TEXT,
+                    baseline_count INTEGER,
+                    observed_count INTEGER,
+                    diff INTEGER,
+                    streak INTEGER,
+                    cooldown_until_ms INTEGER,
+                    detail_json TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS state_log_ts ON state_log(ts_ms)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS state_snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts_ms INTEGER NOT NULL,
+                    log_id INTEGER NOT NULL,
+                    state_json TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS state_snapshots_ts ON state_snapshots(ts_ms)")
+            conn.execute("CREATE INDEX IF NOT EXISTS state_snapshots_log_id ON state_snapshots(log_id)")
+            conn.commit()
+
+    def append(self, entry: LogEntry) -> int:
+        """Insert an entry and return its id.
+
+        state_at() picks snapshots by ts_ms and replays in id order, so ts_ms must
+        not decrease with id even when several workers append: the time is taken
+        after BEGIN IMMEDIATE has the write lock, and never earlier than the last
+        entry's (clock steps back, or an explicit older entry.ts_ms)."""
+        if entry.kind not in KINDS:
+            raise ValueError(f"Unknown log entry kind: {entry.kind}")
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            last = conn.execute("SELECT ts_ms FROM state_log ORDER BY id DESC LIMIT 1").fetchone()
+            entry.ts_ms = max(entry.ts_ms or int(time.time() * 1000), last["ts_ms"] if last else 0)
+            cursor = conn.execute(
+                f"INSERT INTO state_log({_INSERT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.ts_ms,
+                    entry.kind,
+                    entry.session,
+                    entry.state,
+                    entry.baseline_count,
+                    entry.observed_count,
+                    entry.diff,
+                    entry.streak,
+                    entry.cooldown_until_ms,
+                    json.dumps(entry.detail) if entry.detail else None,
+                ),
+            )
+            event_id = cursor.lastrowid
+            if event_id % self.snapshot_every == 0:
+                # Ids are global across writers, so exactly one append per block snapshots it.
+                state, _, _ = self._fold(conn, until_id=event_id)
+                conn.execute(
+                    "INSERT INTO state_snapshots(ts_ms, log_id, state_json) VALUES (?, ?, ?)",
+                    (state["ts_ms"], event_id, json.dumps(state)),
+                )
+            conn.commit()
+        return event_id
+
+    def _fold(
+        self, conn: sqlite3.Connection, *, until_id: int | None = None, until_ts_ms: int | None = None
+    ) -> tuple[dict[str, Any], int | None, int]:
+        """Nearest snapshot plus a bounded replay. Returns (state, snapshot log id, entries replayed)."""
+        if until_id is not None:
+            snap = conn.execute(
+                "SELECT log_id, state_json FROM state_snapshots WHERE log_id <= ? ORDER BY log_id DESC LIMIT 1",
+                (until_id,),
+            ).fetchone()
+        else:
+            snap = conn.execute(
+                "SELECT log_id, state_json FROM state_snapshots WHERE ts_ms <= ? ORDER BY ts_ms DESC, log_id DESC LIMIT 1",
+                (until_ts_ms,),
+            ).fetchone()
+        state = json.loads(snap["state_json"]) if snap else empty_state()
+        snapshot_id = snap["log_id"] if snap else None
+        since_id = snapshot_id or 0
+
+        if until_id is not None:
+            where, bound = "id > ? AND id <= ?", until_id
+        else:
+            where, bound = "id > ? AND ts_ms <= ?", until_ts_ms
+        # A snapshot exists every snapshot_every ids, so the tail is bounded; the
+        # limit only guards against a snapshot that failed to be written.
+        rows = conn.execute(
+            f"SELECT {_COLUMNS} FROM state_log WHERE {where} ORDER BY id ASC LIMIT ?",
+            (since_id, bound, 2 * self.snapshot_every),
+        ).fetchall()
+        for row in rows:
+            state = apply(state, row["id"], _entry_from_row(row))
+        return state, snapshot_id, len(rows)
+
+    def state_at(self, ts_ms: int) -> dict[str, Any]:
+        """System state as of ts_ms (epoch milliseconds)."""
+        started = time.perf_counter()
+        with self._connect() as conn:
+            state, snapshot_id, replayed = self._fold(conn, until_ts_ms=ts_ms)
+        return {
+            "at_ms": ts_ms,
+            "state": state,
+            "snapshot_log_id": snapshot_id,
+            "replayed": replayed,
+            "query_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def entries(
+        self,
+        since_ms: int | None = None,
+        until_ms: int | None = None,
+        kind: str | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        clauses, params = [], []
+        if since_ms is not None:
+            clauses.append("ts_ms >= ?")
+            params.append(since_ms)
+        if until_ms is not None:
+            clauses.append("ts_ms <= ?")
+            params.append(until_ms)
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM state_log {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [{"id": row["id"], **asdict(_entry_from_row(row))} for row in rows]
@@ -0,0 +1,122 @@
+"""
+Per-session occupancy heatmap built from detection boxes.
+
+Every frame, each box adds its area to a coarse grid and older frames fade
+out with an exponential half-life. Two tricks keep the per-frame cost at a
+few scalar updates per box:
+  - boxes go into a 2-D difference array (four corner updates on a flat
+    Python list, cheaper per element than NumPy item access), which is
+    integrated with cumsum only when the grid is read;
+  - decay is applied lazily: new boxes are added with a growing gain, and
+    the grid and frame mass are renormalized together only when the gain
+    gets large.
+
+occupancy() is the decay-weighted number of boxes covering each cell per
+frame (1.0 = always covered by one item). capture_baseline() freezes it (on set_baseline) so diff()
+shows where items have appeared (+) or gone missing (-) since then.
+"""
+from __future__ import annotations
+
+import base64
+import math
+import time
+from typing import Any, Iterable
+
+import numpy as np
+
+from .vision import DetectionBox
+
+_RENORMALIZE_AT = 1e6
+
+
+class OccupancyHeatmap:
+    def __init__(self, rows: int = 24, cols: int = 32, half_life_frames: float = 300.0):
+        self.rows = rows
+        self.cols = cols
+        self.decay = 0.5 ** (1.0 / half_life_frames) if half_life_frames > 0 else 1.0
+        self._delta = [0.0] * ((rows + 1) * (cols + 1))
+        self._mass = 0.0
+        self._gain = 1.0
+        self.frames = 0
+        self.updated_at = time.time()  # creation counts as activity, so a new grid is not the eviction victim
+        self.baseline: np.ndarray | None = None
+
+    def update(self, detections: Iterable[DetectionBox]) -> None:
+        self._gain /= self.decay
+        gain = self._gain
+        rows, cols = self.rows, self.cols
+        stride = cols + 1
+        delta = self._delta
+        for det in detections:
+            r0 = min(rows - 1, max(0, int(det.y1_norm * rows)))
+            c0 = min(cols - 1, max(0, int(det.x1_norm * cols)))
+            r1 = max(r0 + 1, min(rows, math.ceil(det.y2_norm * rows)))
+            c1 = max(c0 + 1, min(cols, math.ceil(det.x2_norm * cols)))
+            delta[r0 * stride + c0] += gain
+            delta[r0 * stride + c1] -= gain
+            delta[r1 * stride + c0] -= gain
+            delta[r1 * stride + c1] += gain
+        self._mass += gain
+        self.frames += 1
+        self.updated_at = time.time()
+        if gain > _RENORMALIZE_AT:
+            self._delta = [v / gain for v in self._delta]
+            self._mass /= gain
+            self._gain = 1.0
+
+    def occupancy(self) -> np.ndarray:
+        if self._mass <= 0:
+            return np.zeros((self.rows, self.cols), dtype=np.float32)
+        delta = np.asarray(self._delta).reshape(self.rows + 1, self.cols + 1)
+        grid = delta.cumsum(axis=0).cumsum(axis=1)[: self.rows, : self.cols]
+        return (grid / self._mass).astype(np.float32)
+
+    def capture_baseline(self) -> None:
+        self.baseline = self.occupancy()
+
+    def diff(self) -> np.ndarray | None:
+        if self.baseline is None:
+            return None
+        return self.occupancy() - self.baseline
+
+    def encode(self, kind: str = "diff") -> dict[str, Any] | None:
+        """Grid as int8 (diff, -127..127) or uint8 (occupancy, 0..255) scaled by `scale`, base64 row-major."""
+        if kind == "diff":
+            grid = self.diff()
+            if grid is None:
+                return None
+        elif kind == "baseline":
+            if self.baseline is None:
+                return None
+            grid = self.baseline
+        else:
+            grid = self.occupancy()
+
+        scale = float(np.abs(grid).max())
+        if kind == "diff":
+            levels = 127
+            dtype = "int8"
+        else:
+            levels = 255
+            dtype = "uint8"
+        quantized = np.zeros(grid.shape) if scale == 0 else np.rint(grid / scale * levels)
+        return {
+            "kind": kind,
+            "rows": self.rows,
+            "cols": self.cols,
+            "dtype": dtype,
+            "scale": round(scale, 4),  # value of the largest magnitude level
+            "levels": levels,
+            "frames": self.frames,
+            "data": base64.b64encode(quantized.astype(dtype).tobytes()).decode(),
+        }
+
+
+def keep_recent(heatmaps: dict[str, OccupancyHeatmap], session_id: str, grid: OccupancyHeatmap, limit: int) -> None:
+    """Add a session's grid, first evicting the least recently updated others beyond `limit`."""
+    while len(heatmaps) >= limit:
+        others = [sid for sid in heatmaps if sid != session_id]
+        if not others:
+            break
+        del heatmaps[min(others, key=lambda sid: heatmaps[sid].updated_at)]
+    heatmaps[session_id] = grid
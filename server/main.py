@@ -1,90 +1,386 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import hmac
 import json
+import os
 import time
+from datetime import datetime
 from pathlib import Path
 from typing import Any
 
 import cv2
 import numpy as np
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 
 from .agent import AlertAgent
-from .agent_gemma import GemmaAgent
+from .agent_gemma import DecisionCache, GemmaAgent
+from .assets import AssetBundle
+from .backend import InProcessStateBackend, SharedStateBackend, StateBackend
+from .cascade import DecisionCascade
+from .checkpoint import Checkpointer, load_checkpoint
 from .db import EventDB
+from .eventlog import KINDS as LOG_KINDS, LogEntry, StateLog
+from .heatmap import OccupancyHeatmap, keep_recent
+from .metrics import Metrics
+from .profiling import MODES as PROFILE_MODES, ProfileCapture
+from .pubsub import DashboardBus
 from .settings import settings
 from .state import InventoryStateMachine
-from .vision import ChairCounter
+from .recording import FrameRecorder, open_session_recorder
+from .rolling import RollingWindow
+from .snapshots import FrameRing, SnapshotStore
+from .vision import ChairCounter, StubCounter
 
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
 
 app = FastAPI(title="Offline Staging Inventory Copilot V1")
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
-
-chair_counter = ChairCounter(
-    model_name=settings.yolo_model,
-    chair_class_name=settings.chair_class_name,
-    conf_threshold=settings.conf_threshold,
-)
+assets = AssetBundle(STATIC_DIR)  # gzip/brotli variants and content hashes, built once at startup
+
+chair_counter: ChairCounter | StubCounter
+if settings.vision_backend == "stub":
+    chair_counter = StubCounter()
+else:
+    chair_counter = ChairCounter(
+        model_name=settings.yolo_model,
+        chair_class_name=settings.chair_class_name,
+        conf_threshold=settings.conf_threshold,
+    )
 agent = AlertAgent(
     ollama_base_url=settings.ollama_base_url,
     ollama_model=settings.ollama_model,
     timeout_sec=settings.ollama_timeout_sec,
+    cache_size=settings.alert_cache_size,
+    cache_ttl_sec=settings.alert_cache_ttl_sec,
+    prefetch_span=settings.alert_prefetch_span,
 )
 db = EventDB(settings.sqlite_path)
-state_machine = InventoryStateMachine(
-    debounce_k=settings.debounce_k,
-    cooldown_sec=settings.cooldown_sec,
-)
-dashboard_clients: set[WebSocket] = set()
+state_log = StateLog(settings.sqlite_path, snapshot_every=settings.state_log_snapshot_every)
+# Inventory state: in this process (one worker) or shared by every worker on the host.
+state_backend: StateBackend
+dashboard_bus: DashboardBus | None = None
+if settings.state_backend == "shared":
+    state_backend = SharedStateBackend(
+        settings.state_shared_dir,
+        debounce_k=settings.debounce_k,
+        cooldown_sec=settings.cooldown_sec,
+        smoothing=settings.count_smoothing,
+    )
+    dashboard_bus = DashboardBus(Path(settings.state_shared_dir) / "bus")
+else:
+    state_backend = InProcessStateBackend(
+        InventoryStateMachine(
+            debounce_k=settings.debounce_k,
+            cooldown_sec=settings.cooldown_sec,
+            smoothing=settings.count_smoothing,
+        )
+    )
+checkpointer: Checkpointer | None = None
+if settings.state_checkpoint_path:
+    _restored = load_checkpoint(settings.state_checkpoint_path)
+    # A running worker may already hold live shared state; that is newer than the file.
+    if _restored is not None and state_backend.fresh:
+        with state_backend.transaction() as _sm:
+            _sm.restore(_restored["state_machine"])
+            _restored_state = _sm.snapshot()
+        db.log_event("state_restored", {"saved_at": _restored["saved_at"], **_restored_state})
+        state_log.append(
+            LogEntry(
+                kind="restored",
+                state=_restored_state["state"],
+                baseline_count=_restored_state["baseline_count"],
+                observed_count=_restored_state["last_observed_count"],
+                cooldown_until_ms=int((_restored_state["cooldown_until_epoch"] or 0) * 1000),
+                detail={"saved_at": _restored["saved_at"]},
+            )
+        )
+    checkpointer = Checkpointer(settings.state_checkpoint_path, settings.state_checkpoint_interval_sec)
+snapshot_store: SnapshotStore | None = None
+if settings.snapshot_dir:
+    snapshot_store = SnapshotStore(settings.snapshot_dir, max_bytes=int(settings.snapshot_max_mb * 1e6))
+dashboard_clients: set[WebSocket] = set()  # this worker's dashboards; others are reached via dashboard_bus
+metrics = Metrics()
+profiler = ProfileCapture()
 
 # Fine-tuned Gemma agent (loads in background, falls back gracefully if unavailable)
 gemma_agent = GemmaAgent(
     base_model_id=settings.gemma_base_model,
     adapter_path=settings.gemma_adapter_path,
     hf_token=settings.gemma_hf_token,
+    max_pending=settings.gemma_queue_max,
+    decision_cache=DecisionCache(
+        max_size=settings.gemma_cache_size,
+        streak_edges=settings.gemma_cache_streak_edges,
+        conf_step=settings.gemma_cache_conf_step,
+        history_tail=settings.gemma_cache_history_tail,
+    ),
+    reuse_prefix_cache=settings.gemma_prefix_cache,
+    constrained_decoding=settings.gemma_constrained_decoding,
+    cpu_artifact_path=settings.gemma_cpu_artifact,
+    batch_size=settings.gemma_batch_size,
+    batch_window_ms=settings.gemma_batch_window_ms,
+    profiler=profiler,
 )
 if settings.gemma_enabled:
     gemma_agent.load_async()
+decision_cascade = DecisionCascade(
+    gemma_agent,
+    enabled=settings.decision_cascade,
+    gemma_enabled=settings.gemma_enabled,
+    streak_margin=settings.cascade_streak_margin,
+    conf_margin=settings.cascade_conf_margin,
+    oscillation_flips=settings.cascade_oscillation_flips,
+    metrics=metrics,
+)
 
 # Sample every Nth frame for observation logging to avoid DB bloat
 _OBS_SAMPLE_EVERY = 3
+_MAX_HEATMAPS = 32
 _frame_counter: int = 0
-_history: list[int] = []  # rolling window of item counts for Gemma context
+_count_windows: dict[str, RollingWindow] = {}  # per-session counts/confidences for smoothing and Gemma context
+_heatmaps: dict[str, OccupancyHeatmap] = {}  # per-session detection occupancy, kept after disconnect
+_gemma_relays: set[asyncio.Task] = set()  # strong refs so pending relays are not GC'd
+
+
+def _checkpoint_snapshot(sm: InventoryStateMachine) -> dict[str, Any]:
+    # Sessions are connection-scoped and not restored; they are recorded so a
+    # restart shows what was attached when the server went down.
+    return {
+        "state_machine": sm.snapshot(),
+        "sessions": {
+            sid: {"frames": len(window), "latest_count": window.latest()}
+            for sid, window in list(_count_windows.items())
+        },
+    }
+
+
+def _checkpoint(sm: InventoryStateMachine) -> None:
+    """Queue a checkpoint if state changed or the interval passed; the write runs off-thread."""
+    if checkpointer is not None:
+        checkpointer.maybe_submit(sm.revision, lambda: _checkpoint_snapshot(sm))
+
+
+def _log_state(kind: str, sm: InventoryStateMachine, session: str | None = None, **detail: Any) -> None:
+    """Append the machine's post-event state to the typed state log."""
+    diff = None
+    if sm.baseline_count is not None and sm.last_observed_count is not None:
+        diff = sm.last_observed_count - sm.baseline_count
+    cooldown_remaining = max(0.0, sm.cooldown_until_monotonic - time.monotonic())
+    state_log.append(
+        LogEntry(
+            kind=kind,
+            state=sm.state.value,
+            baseline_count=sm.baseline_count,
+            observed_count=sm.last_observed_count,
+            diff=diff,
+            streak=sm.discrepancy_streak,
+            cooldown_until_ms=int((time.time() + cooldown_remaining) * 1000) if cooldown_remaining else 0,
+            session=session,
+            detail=detail,
+        )
+    )
+
+
+def _parse_ts_ms(value: str) -> int:
+    """Epoch milliseconds or ISO 8601 (naive times are local) -> epoch milliseconds."""
+    if value.lstrip("-").isdigit():
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Not a timestamp: {value}")
+
 
+@app.on_event("startup")
+async def _start_dashboard_bus() -> None:
+    if dashboard_bus is not None:
+        await dashboard_bus.start(_on_bus_message)
 
-@app.get("/")
-def landing_page() -> FileResponse:
-    return FileResponse(STATIC_DIR / "index.html")
 
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    if dashboard_bus is not None:
+        dashboard_bus.close()
+    if checkpointer is not None:
+        checkpointer.submit(_checkpoint_snapshot(state_backend.view()))
+        checkpointer.close()
 
-@app.get("/phone")
-def phone_app() -> FileResponse:
-    return FileResponse(STATIC_DIR / "phone.html")
 
+@app.api_route("/", methods=["GET", "HEAD"])
+def landing_page(request: Request) -> Response:
+    return assets.response("index.html", request)
 
-@app.get("/dashboard")
-def dashboard() -> FileResponse:
-    return FileResponse(STATIC_DIR / "dashboard.html")
+
+@app.api_route("/phone", methods=["GET", "HEAD"])
+def phone_app(request: Request) -> Response:
+    return assets.response("phone.html", request)
+
+
+@app.api_route("/dashboard", methods=["GET", "HEAD"])
+def dashboard(request: Request) -> Response:
+    return assets.response("dashboard.html", request)
+
+
+@app.api_route("/static/{name}", methods=["GET", "HEAD"])
+def static_asset(name: str, request: Request) -> Response:
+    if name not in assets:
+        raise HTTPException(status_code=404, detail="Not found")
+    return assets.response(name, request)
 
 
 @app.get("/api/health")
 def health() -> JSONResponse:
+    sm = state_backend.view()
     return JSONResponse(
         {
             "ok": True,
-            "state": state_machine.state,
-            "baseline": state_machine.baseline_count,
-            "last_observed": state_machine.last_observed_count,
+            "state": sm.state,
+            "baseline": sm.baseline_count,
+            "last_observed": sm.last_observed_count,
+            "state_backend": state_backend.name,
+            "worker_pid": os.getpid(),
+            "dashboard_bus": dashboard_bus.stats() if dashboard_bus is not None else None,
+            "alert_cache": agent.cache_stats(),
+            "gemma_queue": gemma_agent.queue_stats(),
+            "gemma_cache": gemma_agent.decision_cache.stats(),
+            "gemma_decode": gemma_agent.decode_stats(),
+            "decision_cascade": decision_cascade.stats(),
+            "checkpoint": checkpointer.stats() if checkpointer is not None else None,
+            "snapshots": snapshot_store.stats() if snapshot_store is not None else None,
+            "count_windows": {sid: window.stats() for sid, window in list(_count_windows.items())},
+            "metrics": metrics.summary(),
         }
     )
 
 
+@app.get("/api/snapshots/{name}")
+def snapshot_file(name: str, request: Request) -> Response:
+    path = snapshot_store.path_for(name) if snapshot_store is not None else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        # Pruned by the snapshot cap (possibly in another worker) since path_for checked it.
+        raise HTTPException(status_code=404, detail="Snapshot not found") from None
+    # Names are unique and files are never rewritten, so clients may cache them for good.
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers, stat_result=stat)
+
+
+@app.get("/api/heatmap")
+def heatmap(session: str | None = None, kind: str = "diff") -> JSONResponse:
+    """Quantized occupancy grid of a session (default: the most recently updated one).
+
+    Grids live in the worker that serves the session's /ws connection; with
+    several workers, ask that worker (the pid is part of the session id)."""
+    if kind not in ("diff", "current", "baseline"):
+        raise HTTPException(status_code=400, detail="kind must be diff, current or baseline")
+    sessions = list(_heatmaps.items())
+    if session is None and sessions:
+        session = max(sessions, key=lambda item: item[1].updated_at)[0]
+    grid = _heatmaps.get(session) if session is not None else None
+    if grid is None:
+        owner = session.split("-")[1] if session and session.startswith("ws-") and session.count("-") >= 2 else None
+        if owner is not None and owner != str(os.getpid()):
+            raise HTTPException(
+                status_code=421, detail=f"Session is served by worker pid {owner}; heatmaps are per worker"
+            )
+        raise HTTPException(status_code=404, detail="No heatmap for this session")
+    encoded = grid.encode(kind)
+    if encoded is None:
+        raise HTTPException(status_code=409, detail="No baseline captured yet; send set_baseline first")
+    return JSONResponse({"session": session, **encoded})
+
+
+@app.get("/api/state_at")
+def state_at(at: str) -> JSONResponse:
+    """Rebuild system state as of `at` from the nearest snapshot plus a bounded replay."""
+    return JSONResponse(state_log.state_at(_parse_ts_ms(at)))
+
+
+@app.get("/api/state_log")
+def state_log_entries(
+    since: str | None = None, until: str | None = None, kind: str | None = None, limit: int = 100
+) -> JSONResponse:
+    if kind is not None and kind not in LOG_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {LOG_KINDS}")
+    entries = state_log.entries(
+        since_ms=_parse_ts_ms(since) if since else None,
+        until_ms=_parse_ts_ms(until) if until else None,
+        kind=kind,
+        limit=max(1, min(limit, 1000)),
+    )
+    return JSONResponse({"entries": entries})
+
+
+@app.get("/api/metrics")
+def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+def _require_admin(request: Request) -> None:
+    # Fail closed: without a configured token the admin routes do not exist.
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+# async so start/stop run on the event loop thread that cProfile must observe.
+@app.post("/api/admin/profile")
+async def start_profile(
+    request: Request, mode: str = "cprofile", frames: int = 0, seconds: float = 0.0
+) -> JSONResponse:
+    _require_admin(request)
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {PROFILE_MODES}")
+    if frames <= 0 and seconds <= 0:
+        seconds = 10.0
+    try:
+        profiler.start(mode, frames=min(frames, 10_000), seconds=min(seconds, 300.0))
+    except RuntimeError as ex:
+        raise HTTPException(status_code=409, detail=str(ex))
+    return JSONResponse(profiler.status())
+
+
+@app.get("/api/admin/profile")
+async def profile_status(request: Request) -> JSONResponse:
+    _require_admin(request)
+    return JSONResponse(profiler.status())
+
+
+@app.post("/api/admin/profile/stop")
+async def stop_profile(request: Request) -> JSONResponse:
+    _require_admin(request)
+    profiler.stop()
+    return JSONResponse(profiler.status())
+
+
+@app.get("/api/admin/profile/download")
+async def download_profile(request: Request) -> Response:
+    _require_admin(request)
+    result = profiler.result()
+    if result is None:
+        raise HTTPException(status_code=404, detail="No finished profile capture")
+    data, fmt = result
+    filename = "edgedetect.pstats" if fmt == "pstats" else "edgedetect.collapsed.txt"
+    return Response(
+        data,
+        media_type="application/octet-stream" if fmt == "pstats" else "text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.get("/api/events")
 def events(limit: int = 50) -> JSONResponse:
     return JSONResponse({"events": db.recent_events(limit=min(limit, 200))})
@@ -108,7 +404,10 @@ def config() -> JSONResponse:
 
 
 def _decode_b64_jpeg(jpeg_b64: str) -> np.ndarray:
-    raw = base64.b64decode(jpeg_b64)
+    return _decode_jpeg_bytes(base64.b64decode(jpeg_b64))
+
+
+def _decode_jpeg_bytes(raw: bytes) -> np.ndarray:
     arr = np.frombuffer(raw, dtype=np.uint8)
     frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
     if frame is None:
@@ -128,24 +427,36 @@ def _resize_for_model(frame: np.ndarray) -> np.ndarray:
     return cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
 
 
+def _count_and_diff(sm: InventoryStateMachine, decision_count: int | None) -> tuple[int | None, int]:
+    """Count shown to users and its diff, both from the count the state machine
+    decides on (smoothed with COUNT_SMOOTHING), so they agree with alerts."""
+    count = decision_count if decision_count is not None else sm.last_observed_count
+    diff = count - sm.baseline_count if count is not None and sm.baseline_count is not None else 0
+    return count, diff
+
+
 async def _send_status(
-    ws: WebSocket, *, average_conf: float, timestamp_ms: int, detections: list[dict[str, float]]
+    ws: WebSocket,
+    *,
+    sm: InventoryStateMachine,
+    average_conf: float,
+    timestamp_ms: int,
+    detections: list[dict[str, float]],
+    decision_count: int | None = None,
 ) -> None:
-    diff = 0
-    if state_machine.baseline_count is not None and state_machine.last_observed_count is not None:
-        diff = state_machine.last_observed_count - state_machine.baseline_count
-
-    cooldown_remaining = max(0.0, state_machine.cooldown_until_monotonic - time.monotonic())
+    count, diff = _count_and_diff(sm, decision_count)
+    cooldown_remaining = max(0.0, sm.cooldown_until_monotonic - time.monotonic())
     await ws.send_json(
         {
             "type": "status",
             "timestamp_ms": timestamp_ms,
-            "state": state_machine.state,
-            "item_count": state_machine.last_observed_count,
-            "chair_count": state_machine.last_observed_count,  # backwards compat
-            "baseline_count": state_machine.baseline_count,
+            "state": sm.state,
+            "item_count": count,
+            "chair_count": count,  # backwards compat
+            "raw_count": sm.last_observed_count,
+            "baseline_count": sm.baseline_count,
             "diff": diff,
-            "discrepancy_streak": state_machine.discrepancy_streak,
+            "discrepancy_streak": sm.discrepancy_streak,
             "cooldown_remaining_sec": round(cooldown_remaining, 2),
             "average_conf": round(average_conf, 3),
             "detections": detections,
@@ -157,22 +468,23 @@ async def _send_status(
 
 def _activity_payload(
     *,
+    sm: InventoryStateMachine,
     timestamp_ms: int,
     average_conf: float = 0.0,
     detections: list[dict[str, float]] | None = None,
+    decision_count: int | None = None,
 ) -> dict[str, Any]:
-    diff = 0
-    if state_machine.baseline_count is not None and state_machine.last_observed_count is not None:
-        diff = state_machine.last_observed_count - state_machine.baseline_count
-    cooldown_remaining = max(0.0, state_machine.cooldown_until_monotonic - time.monotonic())
+    count, diff = _count_and_diff(sm, decision_count)
+    cooldown_remaining = max(0.0, sm.cooldown_until_monotonic - time.monotonic())
     return {
         "type": "activity",
         "timestamp_ms": timestamp_ms,
-        "state": state_machine.state,
-        "observed_count": state_machine.last_observed_count,
-        "baseline_count": state_machine.baseline_count,
+        "state": sm.state,
+        "observed_count": count,
+        "raw_count": sm.last_observed_count,
+        "baseline_count": sm.baseline_count,
         "diff": diff,
-        "discrepancy_streak": state_machine.discrepancy_streak,
+        "discrepancy_streak": sm.discrepancy_streak,
         "cooldown_remaining_sec": round(cooldown_remaining, 2),
         "average_conf": round(average_conf, 3),
         "detections_count": len(detections or []),
@@ -180,6 +492,26 @@ def _activity_payload(
 
 
 async def _broadcast_dashboard(payload: dict[str, Any]) -> None:
+    if dashboard_bus is not None:
+        dashboard_bus.publish(payload)
+    await _broadcast_local(payload)
+
+
+async def _on_bus_message(payload: dict[str, Any]) -> None:
+    """Broadcast relayed from another worker."""
+    if payload.get("type") == "event" and payload.get("event") == "baseline_set":
+        _capture_heatmap_baselines()
+    await _broadcast_local(payload)
+
+
+def _capture_heatmap_baselines() -> None:
+    # One baseline is shared by every camera, so every session's grid gets a new reference.
+    for grid in list(_heatmaps.values()):
+        if grid.frames:
+            grid.capture_baseline()
+
+
+async def _broadcast_local(payload: dict[str, Any]) -> None:
     if not dashboard_clients:
         return
     dead: list[WebSocket] = []
@@ -192,18 +524,72 @@ async def _broadcast_dashboard(payload: dict[str, Any]) -> None:
         dashboard_clients.discard(client)
 
 
-async def _handle_command(ws: WebSocket, data: dict[str, Any]) -> None:
+async def _relay_gemma_decision(
+    ws: WebSocket, decision_future: asyncio.Future, *, streak: int, session_id: str
+) -> None:
+    try:
+        decision = await decision_future
+    except asyncio.CancelledError:
+        # Superseded by a newer scene from the same session.
+        return
+    if decision is None:
+        return
+
+    payload: dict[str, Any] = {
+        "type": "gemma_decision",
+        "action": decision.action,
+        "raw_output": decision.raw_output,
+        "source": decision.source,
+    }
+    if decision.action == "trigger_alert":
+        payload["severity"] = decision.severity
+        payload["message"] = decision.message
+        db.log_event("gemma_alert", {
+            "action": decision.action,
+            "severity": decision.severity,
+            "message": decision.message,
+            "raw_output": decision.raw_output,
+            "streak": streak,
+            "source": decision.source,
+        })
+    elif decision.action == "rebaseline":
+        payload["new_count"] = decision.new_count
+        db.log_event("gemma_rebaseline", {
+            "new_count": decision.new_count,
+            "raw_output": decision.raw_output,
+            "source": decision.source,
+        })
+    elif decision.action == "ignore_event":
+        payload["reason"] = decision.reason
+        db.log_event("gemma_ignore", {
+            "reason": decision.reason,
+            "raw_output": decision.raw_output,
+            "source": decision.source,
+        })
+    detail = {key: value for key, value in payload.items() if key not in ("type", "raw_output")}
+    _log_state("gemma_decision", state_backend.view(), session_id, **detail)
+    try:
+        await ws.send_json(payload)
+    except Exception:
+        pass
+
+
+async def _handle_command(ws: WebSocket, data: dict[str, Any], session_id: str | None = None) -> None:
     cmd = data.get("command")
     if cmd == "set_baseline":
-        if state_machine.last_observed_count is None:
+        with state_backend.transaction() as sm:
+            if sm.last_observed_count is not None:
+                sm.set_baseline(sm.last_observed_count)
+        if sm.last_observed_count is None:
             await ws.send_json({"type": "error", "message": "No observation available yet."})
             return
-        state_machine.set_baseline(state_machine.last_observed_count)
+        agent.prefetch(sm.baseline_count)
+        _log_state("baseline", sm, session_id)
         db.log_event(
             "baseline_set",
             {
-                "baseline_count": state_machine.baseline_count,
-                "observed_count": state_machine.last_observed_count,
+                "baseline_count": sm.baseline_count,
+                "observed_count": sm.last_observed_count,
             },
         )
         await ws.send_json({"type": "ack", "command": cmd, "ok": True})
@@ -213,13 +599,15 @@ async def _handle_command(ws: WebSocket, data: dict[str, Any]) -> None:
                 "event": "baseline_set",
                 "timestamp_ms": int(time.time() * 1000),
                 "payload": {
-                    "baseline_count": state_machine.baseline_count,
-                    "observed_count": state_machine.last_observed_count,
+                    "baseline_count": sm.baseline_count,
+                    "observed_count": sm.last_observed_count,
                 },
             }
         )
     elif cmd == "arm":
-        state_machine.arm()
+        with state_backend.transaction() as sm:
+            sm.arm()
+        _log_state("arm", sm, session_id)
         await ws.send_json({"type": "ack", "command": cmd, "ok": True})
         await _broadcast_dashboard(
             {
@@ -230,7 +618,9 @@ async def _handle_command(ws: WebSocket, data: dict[str, Any]) -> None:
             }
         )
     elif cmd == "disarm":
-        state_machine.disarm()
+        with state_backend.transaction() as sm:
+            sm.disarm()
+        _log_state("disarm", sm, session_id)
         await ws.send_json({"type": "ack", "command": cmd, "ok": True})
         await _broadcast_dashboard(
             {
@@ -241,7 +631,9 @@ async def _handle_command(ws: WebSocket, data: dict[str, Any]) -> None:
             }
         )
     elif cmd == "reset":
-        state_machine.reset()
+        with state_backend.transaction() as sm:
+            sm.reset()
+        _log_state("reset", sm, session_id)
         db.log_event("reset", {})
         await ws.send_json({"type": "ack", "command": cmd, "ok": True})
         await _broadcast_dashboard(
@@ -260,8 +652,17 @@ async def _handle_command(ws: WebSocket, data: dict[str, Any]) -> None:
 
 @app.websocket("/ws")
 async def ws_endpoint(ws: WebSocket) -> None:
-    global _frame_counter, _history
+    global _frame_counter
     await ws.accept()
+    session_id = f"ws-{os.getpid()}-{id(ws):x}"
+    window = RollingWindow(settings.count_window)
+    frame_ring = FrameRing(settings.snapshot_frames)
+    occupancy = OccupancyHeatmap(settings.heatmap_rows, settings.heatmap_cols, settings.heatmap_half_life_frames)
+    keep_recent(_heatmaps, session_id, occupancy, _MAX_HEATMAPS)
+    _count_windows[session_id] = window
+    recorder: FrameRecorder | None = None
+    if settings.record_dir:
+        recorder = open_session_recorder(settings.record_dir, session_id)
 
     # Send config immediately so phone knows what object is being tracked
     await ws.send_json({
@@ -280,136 +681,140 @@ async def ws_endpoint(ws: WebSocket) -> None:
                 timestamp_ms = int(data.get("timestamp_ms") or int(time.time() * 1000))
                 jpeg_b64 = data.get("jpeg_b64")
                 if not jpeg_b64:
+                    metrics.inc("frames_dropped")
                     await ws.send_json({"type": "error", "message": "Missing jpeg_b64"})
                     continue
 
+                frame_started = time.perf_counter()
                 try:
-                    frame = _decode_b64_jpeg(jpeg_b64)
-                    frame = _resize_for_model(frame)
+                    with metrics.stage("decode"):
+                        jpeg = base64.b64decode(jpeg_b64)
+                        frame = _decode_jpeg_bytes(jpeg)
+                    with metrics.stage("resize"):
+                        frame = _resize_for_model(frame)
                 except Exception as ex:
+                    metrics.inc("frames_dropped")
                     await ws.send_json({"type": "error", "message": f"Bad frame payload: {ex}"})
                     continue
 
-                state_machine.on_stream_started()
-                vision = chair_counter.count_chairs(frame)
-                evaluation = state_machine.evaluate(vision.chair_count)
-
-                # Maintain rolling history for Gemma context
-                _history.append(vision.chair_count)
-                if len(_history) > 20:
-                    _history = _history[-20:]
-
-                await _send_status(
-                    ws,
-                    average_conf=vision.average_conf,
-                    timestamp_ms=timestamp_ms,
-                    detections=[
-                        {
-                            "x1_norm": det.x1_norm,
-                            "y1_norm": det.y1_norm,
-                            "x2_norm": det.x2_norm,
-                            "y2_norm": det.y2_norm,
-                            "conf": det.conf,
-                        }
-                        for det in vision.detections
-                    ],
-                )
-                await _broadcast_dashboard(
-                    _activity_payload(
-                        timestamp_ms=timestamp_ms,
+                metrics.inc("frames")
+                if recorder is not None:
+                    recorder.write(timestamp_ms, jpeg)
+                frame_ring.push(timestamp_ms, jpeg)
+                with metrics.stage("detect"):
+                    vision = chair_counter.count_chairs(frame)
+                with metrics.stage("heatmap"):
+                    occupancy.update(vision.detections)
+                with metrics.stage("evaluate"):
+                    window.push(vision.chair_count, vision.average_conf)
+                    # No awaits inside a transaction: the shared backend holds its lock.
+                    with state_backend.transaction() as sm:
+                        previous_state = sm.state
+                        sm.on_stream_started()
+                        evaluation = sm.evaluate(vision.chair_count, window)
+                    if sm.state != previous_state:
+                        _log_state("transition", sm, session_id, from_state=previous_state.value)
+
+                detections = [
+                    {
+                        "x1_norm": det.x1_norm,
+                        "y1_norm": det.y1_norm,
+                        "x2_norm": det.x2_norm,
+                        "y2_norm": det.y2_norm,
+                        "conf": det.conf,
+                    }
+                    for det in vision.detections
+                ]
+                with metrics.stage("send_status"):
+                    await _send_status(
+                        ws,
+                        sm=sm,
                         average_conf=vision.average_conf,
-                        detections=[
-                            {
-                                "x1_norm": det.x1_norm,
-                                "y1_norm": det.y1_norm,
-                                "x2_norm": det.x2_norm,
-                                "y2_norm": det.y2_norm,
-                                "conf": det.conf,
-                            }
-                            for det in vision.detections
-                        ],
+                        timestamp_ms=timestamp_ms,
+                        detections=detections,
+                        decision_count=evaluation.decision_count,
+                    )
+                with metrics.stage("broadcast"):
+                    await _broadcast_dashboard(
+                        _activity_payload(
+                            sm=sm,
+                            timestamp_ms=timestamp_ms,
+                            average_conf=vision.average_conf,
+                            detections=detections,
+                            decision_count=evaluation.decision_count,
+                        )
                     )
-                )
 
-                # Gemma reasoning every N frames (async, non-blocking)
+                # Decision cascade every N frames (async, non-blocking): rules first, Gemma when
+                # enabled and loaded. Counted per tier as cascade_rule / cascade_gemma.
                 _frame_counter += 1
                 if (
-                    settings.gemma_enabled
-                    and gemma_agent.is_ready
+                    decision_cascade.available
                     and evaluation.baseline_count is not None
                     and evaluation.discrepancy_streak > 0
                     and _frame_counter % settings.gemma_every_n_frames == 0
                 ):
-                    def _on_gemma_decision(decision, ws=ws, evaluation=evaluation):
-                        import asyncio
-                        payload = {
-                            "type": "gemma_decision",
-                            "action": decision.action,
-                            "raw_output": decision.raw_output,
-                        }
-                        if decision.action == "trigger_alert":
-                            payload["severity"] = decision.severity
-                            payload["message"] = decision.message
-                            db.log_event("gemma_alert", {
-                                "action": decision.action,
-                                "severity": decision.severity,
-                                "message": decision.message,
-                                "raw_output": decision.raw_output,
-                                "streak": evaluation.discrepancy_streak,
-                            })
-                        elif decision.action == "rebaseline":
-                            payload["new_count"] = decision.new_count
-                            db.log_event("gemma_rebaseline", {
-                                "new_count": decision.new_count,
-                                "raw_output": decision.raw_output,
-                            })
-                        elif decision.action == "ignore_event":
-                            payload["reason"] = decision.reason
-                            db.log_event("gemma_ignore", {
-                                "reason": decision.reason,
-                                "raw_output": decision.raw_output,
-                            })
-                        try:
-                            loop = asyncio.get_event_loop()
-                            loop.call_soon_threadsafe(
-                                lambda: asyncio.ensure_future(ws.send_json(payload))
-                            )
-                        except Exception:
-                            pass
-
-                    gemma_agent.decide_async(
+                    decision_future = decision_cascade.decide_async(
+                        session_id=session_id,
                         item_count=vision.chair_count,
                         baseline_count=evaluation.baseline_count,
                         streak=evaluation.discrepancy_streak,
                         avg_conf=vision.average_conf,
-                        history=list(_history),
-                        callback=_on_gemma_decision,
+                        history=window.counts(),
                     )
+                    relay = asyncio.create_task(
+                        _relay_gemma_decision(
+                            ws, decision_future, streak=evaluation.discrepancy_streak, session_id=session_id
+                        )
+                    )
+                    _gemma_relays.add(relay)
+                    relay.add_done_callback(_gemma_relays.discard)
 
                 # Log observation sampled every N frames
                 if _frame_counter % _OBS_SAMPLE_EVERY == 0:
-                    db.log_observation(
-                        state=str(evaluation.state),
-                        item_count=vision.chair_count,
-                        baseline_count=evaluation.baseline_count,
-                        diff=evaluation.diff,
-                        avg_conf=vision.average_conf,
-                        streak=evaluation.discrepancy_streak,
-                    )
+                    with metrics.stage("db_log_observation"):
+                        db.log_observation(
+                            state=str(evaluation.state),
+                            item_count=vision.chair_count,
+                            baseline_count=evaluation.baseline_count,
+                            diff=evaluation.diff,
+                            avg_conf=vision.average_conf,
+                            streak=evaluation.discrepancy_streak,
+                        )
 
                 if evaluation.should_alert and evaluation.baseline_count is not None:
-                    alert_text = agent.generate_alert_text(
-                        baseline_count=evaluation.baseline_count,
-                        observed_count=evaluation.observed_count or 0,
-                        diff=evaluation.diff,
-                    )
+                    metrics.inc("alerts")
+                    with metrics.stage("alert_text"):
+                        alert_text = agent.generate_alert_text(
+                            baseline_count=evaluation.baseline_count,
+                            observed_count=evaluation.decision_count or 0,
+                            diff=evaluation.diff,
+                        )
+                    # decision_count is what diff was computed from (smoothed with COUNT_SMOOTHING),
+                    # which also keeps (baseline, observed, diff) aligned with the prefetched texts.
                     event_payload = {
                         "baseline_count": evaluation.baseline_count,
-                        "observed_count": evaluation.observed_count,
+                        "observed_count": evaluation.decision_count,
+                        "raw_count": evaluation.observed_count,
                         "diff": evaluation.diff,
                         "message": alert_text,
                     }
-                    db.log_event("alert", event_payload)
+                    if snapshot_store is not None:
+                        try:
+                            with metrics.stage("alert_snapshot"):
+                                names = await asyncio.to_thread(snapshot_store.save, session_id, frame_ring.frames())
+                            event_payload["snapshots"] = [f"/api/snapshots/{name}" for name in names]
+                        except OSError as ex:
+                            print(f"[Snapshots] Could not save alert frames: {ex}")
+                    with metrics.stage("db_log_event"):
+                        db.log_event("alert", event_payload)
+                        _log_state(
+                            "alert",
+                            sm,
+                            session_id,
+                            message=alert_text,
+                            snapshots=event_payload.get("snapshots", []),
+                        )
                     await ws.send_json({"type": "alert", **event_payload})
                     await _broadcast_dashboard(
                         {
@@ -419,13 +824,25 @@ async def ws_endpoint(ws: WebSocket) -> None:
                         }
                     )
 
+                _checkpoint(sm)
+                metrics.observe("frame_total", time.perf_counter() - frame_started)
+                if profiler.active:
+                    profiler.on_frame()
+
             elif msg_type == "command":
-                await _handle_command(ws, data)
+                await _handle_command(ws, data, session_id)
+                if data.get("command") == "set_baseline" and state_backend.view().baseline_count is not None:
+                    _capture_heatmap_baselines()
+                _checkpoint(state_backend.view())
             else:
                 await ws.send_json({"type": "error", "message": f"Unknown type: {msg_type}"})
 
     except WebSocketDisconnect:
         return
+    finally:
+        _count_windows.pop(session_id, None)
+        if recorder is not None:
+            recorder.close()
 
 
 @app.websocket("/ws/dashboard")
@@ -434,6 +851,7 @@ async def ws_dashboard(ws: WebSocket) -> None:
     dashboard_clients.add(ws)
     await ws.send_json(
         _activity_payload(
+            sm=state_backend.view(),
             timestamp_ms=int(time.time() * 1000),
             average_conf=0.0,
             detections=[],
@@ -0,0 +1,139 @@
+"""
+Low-overhead per-stage latency histograms and counters.
+
+Stage timings go into fixed-bucket histograms (one bisect + three adds per
+observation) and are exported in Prometheus text format. All recording
+happens on the event loop thread, so no locking is needed; readers in
+threadpool endpoints iterate over list() copies of the dicts.
+"""
+from __future__ import annotations
+
+import bisect
+import time
+from typing import Any
+
+# Upper bounds in seconds; a final +Inf bucket is implicit.
+DEFAULT_BUCKETS_SEC = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS_SEC):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th observation; None if it
+        is past the last finite bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return None
+
+    def quantile_ms(self, q: float) -> float | str:
+        """quantile() in ms for JSON; the +Inf bucket is reported as ">2500"."""
+        bound = self.quantile(q)
+        if bound is None:
+            return f">{1000 * self.buckets[-1]:g}"
+        return round(1000 * bound, 3)
+
+
+class _StageTimer:
+    __slots__ = ("_metrics", "_stage", "_started")
+
+    def __init__(self, metrics: Metrics, stage: str):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self) -> None:
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        self._metrics.observe(self._stage, time.perf_counter() - self._started)
+
+
+class Metrics:
+    def __init__(self, namespace: str = "edgedetect"):
+        self.namespace = namespace
+        self.stages: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+        self._timer_cost_sec = self._calibrate()
+
+    def stage(self, name: str) -> _StageTimer:
+        """Context manager timing one stage: `with metrics.stage("decode"): ...`."""
+        return _StageTimer(self, name)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = Histogram()
+        hist.observe(seconds)
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def _calibrate(self, rounds: int = 2000) -> float:
+        """Cost of one timed stage, used to report instrumentation overhead."""
+        started = time.perf_counter()
+        for _ in range(rounds):
+            with self.stage("_calibration"):
+                pass
+        cost = (time.perf_counter() - started) / rounds
+        del self.stages["_calibration"]
+        return cost
+
+    def overhead_pct(self) -> float:
+        """Estimated share of frame time spent recording metrics."""
+        frame = self.stages.get("frame_total")
+        if frame is None or not frame.count:
+            return 0.0
+        observations = sum(h.count for h in list(self.stages.values()))
+        return round(100 * observations * self._timer_cost_sec / frame.sum, 4)
+
+    def summary(self) -> dict[str, Any]:
+        # Called from threadpool endpoints while the event loop may add stages: iterate over copies.
+        return {
+            "counters": dict(self.counters),
+            "stages_ms": {
+                name: {
+                    "count": h.count,
+                    "mean": round(1000 * h.sum / h.count, 3) if h.count else 0.0,
+                    "p50_le": h.quantile_ms(0.50),
+                    "p95_le": h.quantile_ms(0.95),
+                }
+                for name, h in list(self.stages.items())
+            },
+            "instrumentation_overhead_pct": self.overhead_pct(),
+        }
+
+    def prometheus_text(self) -> str:
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_stage_latency_seconds Per-stage frame processing latency.",
+            f"# TYPE {ns}_stage_latency_seconds histogram",
+        ]
+        for name, h in list(self.stages.items()):
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f'{ns}_stage_latency_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{ns}_stage_latency_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{ns}_stage_latency_seconds_sum{{stage="{name}"}} {h.sum:.6f}')
+            lines.append(f'{ns}_stage_latency_seconds_count{{stage="{name}"}} {h.count}')
+        for name, value in list(self.counters.items()):
+            lines.append(f"# TYPE {ns}_{name}_total counter")
+            lines.append(f"{ns}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,167 @@
+"""
+On-demand profiling of the running server.
+
+A capture covers the next N frames or T seconds of ws_endpoint processing:
+  - "cprofile": deterministic cProfile on the event loop thread plus the
+    Gemma inference worker; downloadable as a pstats file.
+  - "sampling": a background thread samples every thread's stack at a fixed
+    interval; downloadable as collapsed stacks (flamegraph.pl / speedscope).
+When no capture is running the frame path only checks `profiler.active`.
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+MODES = ("cprofile", "sampling")
+
+
+class ProfileCapture:
+    def __init__(self, sample_interval_sec: float = 0.005):
+        self.sample_interval_sec = sample_interval_sec
+        self.active = False
+        self.mode: str | None = None
+        self._lock = threading.Lock()
+        self._frames_left = 0
+        self._frames_seen = 0
+        self._started_at = 0.0
+        self._finished_at = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+
+        self._loop_profile: cProfile.Profile | None = None
+        self._thread_profiles: list[cProfile.Profile] = []
+        self._sampler: threading.Thread | None = None
+        self._sampler_stop = threading.Event()
+        self._stacks: Counter[str] = Counter()
+        self._samples = 0
+
+        self._result: bytes | None = None
+        self._result_format: str | None = None
+
+    # ── Control (event loop thread) ──────────────────────────────────────────
+    def start(self, mode: str, frames: int = 0, seconds: float = 0.0) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if self.active:
+            raise RuntimeError("A profile capture is already running")
+
+        self.mode = mode
+        self._frames_left = frames
+        self._frames_seen = 0
+        self._thread_profiles = []
+        self._stacks = Counter()
+        self._samples = 0
+        self._result = None
+        self._result_format = None
+        self._started_at = time.time()
+
+        if mode == "cprofile":
+            self._loop_profile = cProfile.Profile()
+            self._loop_profile.enable()
+        else:
+            self._sampler_stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+            self._sampler.start()
+
+        self.active = True
+        if seconds > 0:
+            self._timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+
+    def on_frame(self) -> None:
+        """Called after each processed frame while a capture is active."""
+        self._frames_seen += 1
+        if self._frames_left and self._frames_seen >= self._frames_left:
+            self.stop()
+
+    def stop(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self.mode == "cprofile" and self._loop_profile is not None:
+            self._loop_profile.disable()
+            stats = pstats.Stats(self._loop_profile)
+            with self._lock:
+                for profile in self._thread_profiles:
+                    stats.add(profile)
+            self._result = marshal.dumps(stats.stats)  # same bytes as Stats.dump_stats
+            self._result_format = "pstats"
+            self._loop_profile = None
+        elif self.mode == "sampling":
+            self._sampler_stop.set()
+            if self._sampler is not None:
+                self._sampler.join(timeout=1.0)
+            with self._lock:
+                lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+            self._result = ("\n".join(lines) + "\n").encode()
+            self._result_format = "collapsed"
+        self._finished_at = time.time()
+
+    # ── Worker threads ────────────────────────────────────────────────────────
+    def run_in_thread(self, fn: Callable[[], Any]) -> Any:
+        """Run fn under cProfile on a worker thread when a cprofile capture is active."""
+        if not (self.active and self.mode == "cprofile"):
+            return fn()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: cProfile is interpreter-wide, the loop profile already covers this thread.
+            return fn()
+        try:
+            return fn()
+        finally:
+            profile.disable()
+            with self._lock:
+                self._thread_profiles.append(profile)
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._sampler_stop.wait(self.sample_interval_sec):
+            if not names or len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            batch = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                batch.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(batch)
+                self._samples += 1
+
+    # ── Results ───────────────────────────────────────────────────────────────
+    def status(self) -> dict[str, Any]:
+        return {
+            "active": self.active,
+            "mode": self.mode,
+            "frames_profiled": self._frames_seen,
+            "frames_target": self._frames_left or None,
+            "samples": self._samples,
+            "started_at": self._started_at or None,
+            "finished_at": self._finished_at if not self.active and self._result is not None else None,
+            "result_format": self._result_format,
+        }
+
+    def result(self) -> tuple[bytes, str] | None:
+        if self.active or self._result is None:
+            return None
+        return self._result, self._result_format or ""
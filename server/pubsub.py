@@ -0,0 +1,132 @@
+"""
+Local pub/sub for dashboard broadcasts across uvicorn workers.
+
+Each worker binds a Unix datagram socket named after its pid in a shared
+directory. publish() sends the JSON payload to every other worker's socket
+without blocking: a peer whose queue is full misses that message (counted
+as dropped), and sockets of workers that have exited are removed. Received
+payloads are handed to the local broadcast function in arrival order.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+_PEER_REFRESH_SEC = 1.0
+_MAX_DATAGRAM = 64 * 1024
+
+
+class DashboardBus:
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}.sock"
+        self._sock: socket.socket | None = None
+        self._queue: asyncio.Queue[dict[str, Any]] | None = None
+        self._consumer: asyncio.Task | None = None
+        self._peers: list[str] = []
+        self._peers_refreshed = 0.0
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    async def start(self, deliver: Callable[[dict[str, Any]], Awaitable[None]]) -> None:
+        """Bind this worker's socket and feed incoming payloads to `deliver`. Call from the event loop."""
+        if self.path.exists():
+            self.path.unlink()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(self.path))
+        sock.setblocking(False)
+        self._sock = sock
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        loop.add_reader(sock.fileno(), self._on_readable)
+        self._consumer = asyncio.create_task(self._consume(deliver))
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                data = self._sock.recv(_MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                self._queue.put_nowait(json.loads(data))
+                self.received += 1
+            except ValueError:
+                continue
+
+    async def _consume(self, deliver: Callable[[dict[str, Any]], Awaitable[None]]) -> None:
+        while True:
+            payload = await self._queue.get()
+            try:
+                await deliver(payload)
+            except Exception as e:
+                print(f"[DashboardBus] Delivery failed: {e}")
+
+    def _peer_paths(self) -> list[str]:
+        now = time.monotonic()
+        if now - self._peers_refreshed >= _PEER_REFRESH_SEC:
+            own = self.path.name
+            self._peers = [
+                str(self.directory / name)
+                for name in os.listdir(self.directory)
+                if name.endswith(".sock") and name != own
+            ]
+            self._peers_refreshed = now
+        return self._peers
+
+    def publish(self, payload: dict[str, Any]) -> None:
+        """Send to every other worker; never blocks the event loop."""
+        if self._sock is None:
+            return
+        peers = self._peer_paths()
+        if not peers:
+            return
+        data = json.dumps(payload).encode()
+        if len(data) > _MAX_DATAGRAM:
+            self.dropped += len(peers)
+            return
+        self.published += 1
+        stale = []
+        for peer in peers:
+            try:
+                self._sock.sendto(data, peer)
+            except (BlockingIOError, InterruptedError):
+                self.dropped += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                stale.append(peer)
+        if stale:
+            for peer in stale:
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            self._peers = [p for p in self._peers if p not in stale]
+
+    def close(self) -> None:
+        if self._consumer is not None:
+            self._consumer.cancel()
+        if self._sock is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            except RuntimeError:
+                pass
+            self._sock.close()
+            self._sock = None
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "peers": len(self._peers),
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
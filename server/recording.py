@@ -0,0 +1,61 @@
+"""
+Append-only recording of camera sessions for offline replay.
+
+File layout: MAGIC, then one record per frame:
+  <q timestamp_ms> <I jpeg_len> <jpeg bytes>
+Raw JPEG bytes are stored as received (after base64 decoding), with the
+phone's timestamp, so a replay can reproduce the original pacing.
+"""
+from __future__ import annotations
+
+import struct
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+MAGIC = b"EDREC1\n"
+_RECORD = struct.Struct("<qI")
+
+
+class FrameRecorder:
+    def __init__(self, path: str | Path, flush_every: int = 30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self.frames = 0
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        self._file: BinaryIO = open(self.path, "ab")
+        if new_file:
+            self._file.write(MAGIC)
+
+    def write(self, timestamp_ms: int, jpeg: bytes) -> None:
+        self._file.write(_RECORD.pack(timestamp_ms, len(jpeg)))
+        self._file.write(jpeg)
+        self.frames += 1
+        if self.frames % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+def open_session_recorder(record_dir: str, session_id: str) -> FrameRecorder:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return FrameRecorder(Path(record_dir) / f"{stamp}-{session_id}.edrec")
+
+
+def read_recording(path: str | Path) -> Iterator[tuple[int, bytes]]:
+    """Yield (timestamp_ms, jpeg_bytes); a truncated trailing record is ignored."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            timestamp_ms, size = _RECORD.unpack(header)
+            jpeg = f.read(size)
+            if len(jpeg) < size:
+                return
+            yield timestamp_ms, jpeg
@@ -0,0 +1,181 @@
+"""
+Per-session rolling window of item counts and detection confidences.
+
+A fixed-capacity ring buffer that keeps mean/variance (running sums), mode
+(frequency buckets) and median (bounded sorted lists) up to date on every
+push, instead of rebuilding a list and recomputing from scratch each frame.
+
+Each value is written twice, at i and i + capacity, so the most recent n
+values are always one contiguous slice: counts()/confs() return read-only
+NumPy views without copying. A view is only valid until the next push.
+"""
+from __future__ import annotations
+
+import bisect
+from typing import Any
+
+import numpy as np
+
+
+SMOOTHING_METHODS = ("none", "mode", "median")
+
+
+class RollingWindow:
+    def __init__(self, capacity: int = 20):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self._counts = np.zeros(2 * capacity, dtype=np.int64)
+        self._confs = np.zeros(2 * capacity, dtype=np.float64)
+        self._head = 0  # next write slot in [0, capacity)
+        self._len = 0
+        self._pushes = 0
+        self._count_sum = 0
+        self._count_sumsq = 0
+        self._conf_sum = 0.0
+        self._conf_sumsq = 0.0
+        self._freq: dict[int, int] = {}
+        self._by_freq: dict[int, set[int]] = {}
+        self._max_freq = 0
+        self._sorted_counts: list[int] = []
+        self._sorted_confs: list[float] = []
+
+    def __len__(self) -> int:
+        return self._len
+
+    def push(self, count: int, conf: float) -> None:
+        count = int(count)
+        conf = float(conf)
+        if self._len == self.capacity:
+            self._evict(int(self._counts[self._head]), float(self._confs[self._head]))
+        else:
+            self._len += 1
+
+        head = self._head
+        self._counts[head] = self._counts[head + self.capacity] = count
+        self._confs[head] = self._confs[head + self.capacity] = conf
+        self._head = (head + 1) % self.capacity
+
+        self._count_sum += count
+        self._count_sumsq += count * count
+        self._conf_sum += conf
+        self._conf_sumsq += conf * conf
+        self._bump(count, +1)
+        bisect.insort(self._sorted_counts, count)
+        bisect.insort(self._sorted_confs, conf)
+
+        self._pushes += 1
+        if self._pushes % (8 * self.capacity) == 0:
+            # Re-derive the float sums now and then so rounding drift stays bounded.
+            confs = self.confs()
+            self._conf_sum = float(confs.sum())
+            self._conf_sumsq = float(np.dot(confs, confs))
+
+    def _evict(self, count: int, conf: float) -> None:
+        self._count_sum -= count
+        self._count_sumsq -= count * count
+        self._conf_sum -= conf
+        self._conf_sumsq -= conf * conf
+        self._bump(count, -1)
+        del self._sorted_counts[bisect.bisect_left(self._sorted_counts, count)]
+        del self._sorted_confs[bisect.bisect_left(self._sorted_confs, conf)]
+
+    def _bump(self, count: int, delta: int) -> None:
+        old = self._freq.get(count, 0)
+        new = old + delta
+        if old:
+            bucket = self._by_freq[old]
+            bucket.discard(count)
+            if not bucket:
+                del self._by_freq[old]
+                if old == self._max_freq and delta < 0:
+                    self._max_freq = new
+        if new:
+            self._freq[count] = new
+            self._by_freq.setdefault(new, set()).add(count)
+            self._max_freq = max(self._max_freq, new)
+        else:
+            del self._freq[count]
+
+    # ── Views ─────────────────────────────────────────────────────────────────
+    def counts(self, n: int | None = None) -> np.ndarray:
+        """Read-only view of the last n counts (all by default), oldest first."""
+        return self._view(self._counts, n)
+
+    def confs(self, n: int | None = None) -> np.ndarray:
+        return self._view(self._confs, n)
+
+    def _view(self, buf: np.ndarray, n: int | None) -> np.ndarray:
+        n = self._len if n is None else max(0, min(n, self._len))
+        end = self._head + self.capacity
+        view = buf[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def latest(self) -> int | None:
+        return int(self._counts[self._head - 1 + self.capacity]) if self._len else None
+
+    # ── Statistics ────────────────────────────────────────────────────────────
+    def count_mean(self) -> float:
+        return self._count_sum / self._len if self._len else 0.0
+
+    def count_var(self) -> float:
+        if not self._len:
+            return 0.0
+        mean = self._count_sum / self._len
+        return max(0.0, self._count_sumsq / self._len - mean * mean)
+
+    def count_median(self) -> float:
+        return _median(self._sorted_counts)
+
+    def count_mode(self) -> int | None:
+        """Most frequent count; ties go to the latest count, then the smallest."""
+        if not self._len:
+            return None
+        top = self._by_freq[self._max_freq]
+        latest = self.latest()
+        return latest if latest in top else min(top)
+
+    def conf_mean(self) -> float:
+        return self._conf_sum / self._len if self._len else 0.0
+
+    def conf_var(self) -> float:
+        if not self._len:
+            return 0.0
+        mean = self._conf_sum / self._len
+        return max(0.0, self._conf_sumsq / self._len - mean * mean)
+
+    def conf_median(self) -> float:
+        return _median(self._sorted_confs)
+
+    def smoothed_count(self, method: str) -> int | None:
+        """Count the state machine should compare to the baseline under `method`."""
+        if method == "mode":
+            return self.count_mode()
+        if method == "median":
+            # Low median keeps the result an observed integer count.
+            return self._sorted_counts[(self._len - 1) // 2] if self._len else None
+        return self.latest()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "frames": self._len,
+            "capacity": self.capacity,
+            "count_mean": round(self.count_mean(), 3),
+            "count_var": round(self.count_var(), 3),
+            "count_median": self.count_median(),
+            "count_mode": self.count_mode(),
+            "conf_mean": round(self.conf_mean(), 3),
+            "conf_var": round(self.conf_var(), 4),
+            "conf_median": round(self.conf_median(), 3),
+        }
+
+
+def _median(sorted_values: list) -> float:
+    n = len(sorted_values)
+    if not n:
+        return 0.0
+    mid = n // 2
+    if n % 2:
+        return float(sorted_values[mid])
+    return (sorted_values[mid - 1] + sorted_values[mid]) / 2
@@ -6,8 +6,10 @@ import os
 class Settings:
     host: str = os.getenv("HOST", "0.0.0.0")
     port: int = int(os.getenv("PORT", "8000"))
+    admin_token: str | None = os.getenv("ADMIN_TOKEN") or None  # /api/admin/* is disabled unless set
 
     # Vision tuning
+    vision_backend: str = os.getenv("VISION_BACKEND", "yolo")  # "yolo" | "stub" (no model, for load tests)
     yolo_model: str = os.getenv("YOLO_MODEL", "./models/yolov8n.pt")
     chair_class_name: str = os.getenv("CHAIR_CLASS_NAME", "chair")
     conf_threshold: float = float(os.getenv("CONF_THRESHOLD", "0.20"))
@@ -19,21 +21,58 @@ class Settings:
     # State machine defaults
     debounce_k: int = int(os.getenv("DEBOUNCE_K", "5"))
     cooldown_sec: int = int(os.getenv("COOLDOWN_SEC", "10"))
+    count_window: int = int(os.getenv("COUNT_WINDOW", "20"))  # frames of counts kept per session
+    count_smoothing: str = os.getenv("COUNT_SMOOTHING", "none")  # "none" | "mode" | "median"
+
+    # Occupancy heatmap
+    heatmap_rows: int = int(os.getenv("HEATMAP_ROWS", "24"))
+    heatmap_cols: int = int(os.getenv("HEATMAP_COLS", "32"))
+    heatmap_half_life_frames: float = float(os.getenv("HEATMAP_HALF_LIFE_FRAMES", "300"))
 
     # Agent / Ollama
     ollama_base_url: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     ollama_model: str = os.getenv("OLLAMA_MODEL", "gemma2:2b")
     ollama_timeout_sec: float = float(os.getenv("OLLAMA_TIMEOUT_SEC", "2.5"))
+    alert_cache_size: int = int(os.getenv("ALERT_CACHE_SIZE", "64"))
+    alert_cache_ttl_sec: float = float(os.getenv("ALERT_CACHE_TTL_SEC", "600"))
+    alert_prefetch_span: int = int(os.getenv("ALERT_PREFETCH_SPAN", "3"))
 
     # Persistence
     sqlite_path: str = os.getenv("SQLITE_PATH", "./inventory_events.db")
+    state_log_snapshot_every: int = int(os.getenv("STATE_LOG_SNAPSHOT_EVERY", "256"))
+    record_dir: str | None = os.getenv("RECORD_DIR") or None  # record incoming camera sessions here
+    snapshot_dir: str | None = os.getenv("SNAPSHOT_DIR", "./snapshots") or None  # alert frames; empty disables
+    snapshot_frames: int = int(os.getenv("SNAPSHOT_FRAMES", "3"))
+    snapshot_max_mb: float = float(os.getenv("SNAPSHOT_MAX_MB", "200"))
+    state_checkpoint_path: str | None = os.getenv("STATE_CHECKPOINT_PATH", "./state_checkpoint.json") or None
+    state_checkpoint_interval_sec: float = float(os.getenv("STATE_CHECKPOINT_INTERVAL_SEC", "5"))
+    state_backend: str = os.getenv("STATE_BACKEND", "memory")  # "memory" (one worker) | "shared" (several)
+    state_shared_dir: str = os.getenv("STATE_SHARED_DIR", "/tmp/edgedetect-state")
 
     # Gemma agent (optional — falls back to rule-based if not set)
     gemma_base_model: str = os.getenv("GEMMA_BASE_MODEL", "google/gemma-2-2b-it")
     gemma_adapter_path: str = os.getenv("GEMMA_ADAPTER_PATH", "./models/gemma-agent/final")
+    gemma_cpu_artifact: str = os.getenv("GEMMA_CPU_ARTIFACT", "./models/gemma-agent/cpu-int8")
     gemma_hf_token: str | None = os.getenv("HF_TOKEN", None)
     gemma_enabled: bool = os.getenv("GEMMA_ENABLED", "true").lower() == "true"
     gemma_every_n_frames: int = int(os.getenv("GEMMA_EVERY_N_FRAMES", "10"))
+    gemma_queue_max: int = int(os.getenv("GEMMA_QUEUE_MAX", "4"))
+    gemma_batch_size: int = int(os.getenv("GEMMA_BATCH_SIZE", "4"))
+    gemma_batch_window_ms: float = float(os.getenv("GEMMA_BATCH_WINDOW_MS", "20"))
+    gemma_prefix_cache: bool = os.getenv("GEMMA_PREFIX_CACHE", "true").lower() == "true"
+    gemma_constrained_decoding: bool = os.getenv("GEMMA_CONSTRAINED_DECODING", "true").lower() == "true"
+    gemma_cache_size: int = int(os.getenv("GEMMA_CACHE_SIZE", "256"))
+    gemma_cache_streak_edges: tuple[int, ...] = tuple(
+        int(v) for v in os.getenv("GEMMA_CACHE_STREAK_EDGES", "6,13,20").split(",") if v.strip()
+    )
+    gemma_cache_conf_step: float = float(os.getenv("GEMMA_CACHE_CONF_STEP", "0.05"))
+    gemma_cache_history_tail: int = int(os.getenv("GEMMA_CACHE_HISTORY_TAIL", "4"))
+
+    # Rule-first cascade in front of Gemma
+    decision_cascade: bool = os.getenv("DECISION_CASCADE", "true").lower() == "true"
+    cascade_streak_margin: int = int(os.getenv("CASCADE_STREAK_MARGIN", "1"))
+    cascade_conf_margin: float = float(os.getenv("CASCADE_CONF_MARGIN", "0.05"))
+    cascade_oscillation_flips: int = int(os.getenv("CASCADE_OSCILLATION_FLIPS", "3"))
 
 
 settings = Settings()
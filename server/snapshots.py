@@ -0,0 +1,119 @@
+"""
+Alert snapshots: the JPEG bytes the phone sent just before an alert.
+
+FrameRing keeps references to the last few raw payloads of a session (the
+bytes objects already produced by base64 decoding; nothing is decoded or
+re-encoded). On alert, SnapshotStore writes them to a directory that is
+capped in total size: the oldest snapshot files are deleted first. The cap
+holds for the directory as a whole, however many workers write to it.
+File names are unique and never rewritten, so they can be cached forever.
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]+\.jpg$")
+
+
+class FrameRing:
+    def __init__(self, capacity: int = 3):
+        self._frames: deque[tuple[int, bytes]] = deque(maxlen=max(1, capacity))
+
+    def push(self, timestamp_ms: int, jpeg: bytes) -> None:
+        self._frames.append((timestamp_ms, jpeg))
+
+    def frames(self) -> list[tuple[int, bytes]]:
+        return list(self._frames)
+
+
+class SnapshotStore:
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Every worker writes into the same directory, so the cap is enforced on what
+        # is on disk, under a flock, rather than on what this process has written.
+        self._lock_fd = os.open(self.directory / ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        self._seq = 0
+        self.files = 0
+        self.total_bytes = 0
+        self.saved = 0
+        self.evicted = 0
+        self._evict()
+
+    def save(self, session_id: str, frames: list[tuple[int, bytes]]) -> list[str]:
+        """Write frames oldest first and return their file names. Blocking; call off the event loop."""
+        with self._lock:
+            self._seq += 1
+            prefix = f"{int(time.time() * 1000)}-{os.getpid()}-{self._seq}-{session_id}"
+        prefix = re.sub(r"[^A-Za-z0-9_-]", "_", prefix)
+        names = []
+        for i, (_, jpeg) in enumerate(frames):
+            name = f"{prefix}-{i}.jpg"
+            path = self.directory / name
+            tmp = path.with_name(f".{name}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(jpeg)
+            os.replace(tmp, path)
+            names.append(name)
+        with self._lock:
+            self.saved += len(names)
+        self._evict()
+        return names
+
+    def _evict(self) -> None:
+        """Delete the oldest snapshots until the directory is within max_bytes."""
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                files = []
+                for entry in os.scandir(self.directory):
+                    if not NAME_RE.match(entry.name):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, entry.name, st.st_size))
+                files.sort()
+                total = sum(size for _, _, size in files)
+                kept = len(files)
+                for _, name, size in files:
+                    if total <= self.max_bytes or kept <= 1:
+                        break
+                    try:
+                        (self.directory / name).unlink()
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    kept -= 1
+                    self.evicted += 1
+                self.files = kept
+                self.total_bytes = total
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def path_for(self, name: str) -> Path | None:
+        """Resolve a snapshot name from a URL; None if malformed or already evicted."""
+        if not NAME_RE.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "files": self.files,
+                "total_mb": round(self.total_bytes / 1e6, 2),
+                "max_mb": round(self.max_bytes / 1e6, 2),
+                "saved": self.saved,
+                "evicted": self.evicted,
+            }
@@ -3,6 +3,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from enum import Enum
 import time
+from typing import Any
+
+from .rolling import RollingWindow
 
 
 class SystemState(str, Enum):
@@ -22,27 +25,32 @@ class FrameEvaluation:
     discrepancy_streak: int
     cooldown_remaining_sec: float
     should_alert: bool
+    decision_count: int | None = None  # count compared to the baseline (smoothed when enabled)
 
 
 class InventoryStateMachine:
-    def __init__(self, debounce_k: int, cooldown_sec: int):
+    def __init__(self, debounce_k: int, cooldown_sec: int, smoothing: str = "none"):
         self.debounce_k = debounce_k
         self.cooldown_sec = cooldown_sec
+        self.smoothing = smoothing  # "none" | "mode" | "median" over the session's RollingWindow
         self.state = SystemState.IDLE
         self.baseline_count: int | None = None
         self.last_observed_count: int | None = None
         self.discrepancy_streak = 0
         self.cooldown_until_monotonic = 0.0
+        self.revision = 0  # bumped whenever state, baseline or cooldown changes
 
     def on_stream_started(self) -> None:
         if self.state == SystemState.IDLE:
             self.state = SystemState.STREAMING
+            self.revision += 1
 
     def set_baseline(self, count: int) -> None:
         self.baseline_count = count
         self.discrepancy_streak = 0
         self.cooldown_until_monotonic = 0.0
         self.state = SystemState.BASELINED
+        self.revision += 1
 
     def arm(self) -> None:
         if self.baseline_count is None:
@@ -50,11 +58,13 @@ class InventoryStateMachine:
         self.discrepancy_streak = 0
         if self.state != SystemState.COOLDOWN:
             self.state = SystemState.ARMED
+        self.revision += 1
 
     def disarm(self) -> None:
         if self.baseline_count is not None:
             self.state = SystemState.BASELINED
             self.discrepancy_streak = 0
+            self.revision += 1
 
     def reset(self) -> None:
         self.state = SystemState.IDLE
@@ -62,16 +72,56 @@ class InventoryStateMachine:
         self.last_observed_count = None
         self.discrepancy_streak = 0
         self.cooldown_until_monotonic = 0.0
-
-    def evaluate(self, observed_count: int) -> FrameEvaluation:
+        self.revision += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """Plain-data copy of everything a restart would otherwise lose.
+
+        The cooldown deadline is stored as wall-clock time because the
+        monotonic clock does not survive a restart.
+        """
+        cooldown_remaining = max(0.0, self.cooldown_until_monotonic - time.monotonic())
+        return {
+            "state": self.state.value,
+            "baseline_count": self.baseline_count,
+            "last_observed_count": self.last_observed_count,
+            "discrepancy_streak": self.discrepancy_streak,
+            "cooldown_until_epoch": time.time() + cooldown_remaining if cooldown_remaining else 0.0,
+            "revision": self.revision,
+        }
+
+    def restore(self, snapshot: dict[str, Any]) -> None:
+        """Resume from snapshot(). The streak starts over: frames seen while the
+        server was down are unknown, so the debounce has to be re-earned."""
+        state = SystemState(snapshot["state"])
+        baseline = snapshot.get("baseline_count")
+        if baseline is None and state not in (SystemState.IDLE, SystemState.STREAMING):
+            state = SystemState.IDLE
+        self.baseline_count = baseline
+        self.last_observed_count = snapshot.get("last_observed_count")
+        self.discrepancy_streak = 0
+        cooldown_remaining = max(0.0, float(snapshot.get("cooldown_until_epoch") or 0.0) - time.time())
+        self.cooldown_until_monotonic = time.monotonic() + cooldown_remaining if cooldown_remaining else 0.0
+        if state == SystemState.COOLDOWN and not cooldown_remaining:
+            state = SystemState.ARMED
+        self.state = state
+        self.revision = int(snapshot.get("revision", 0)) + 1
+
+    def evaluate(self, observed_count: int, window: RollingWindow | None = None) -> FrameEvaluation:
+        """Advance on one frame. With smoothing enabled and a window that already
+        includes this frame, the discrepancy is judged on the smoothed count."""
         now = time.monotonic()
         self.last_observed_count = observed_count
+        decision_count = observed_count
+        if self.smoothing != "none" and window is not None and len(window):
+            decision_count = window.smoothed_count(self.smoothing)
         baseline = self.baseline_count
-        diff = 0 if baseline is None else observed_count - baseline
+        diff = 0 if baseline is None else decision_count - baseline
 
         cooldown_remaining = max(0.0, self.cooldown_until_monotonic - now)
         if self.state == SystemState.COOLDOWN and cooldown_remaining <= 0:
             self.state = SystemState.ARMED
+            self.revision += 1
 
         should_alert = False
 
@@ -90,6 +140,7 @@ class InventoryStateMachine:
                     self.state = SystemState.COOLDOWN
                     self.cooldown_until_monotonic = now + self.cooldown_sec
                     cooldown_remaining = float(self.cooldown_sec)
+                    self.revision += 1
         elif self.state == SystemState.COOLDOWN:
             self.discrepancy_streak = 0
 
@@ -101,4 +152,5 @@ class InventoryStateMachine:
             discrepancy_streak=self.discrepancy_streak,
             cooldown_remaining_sec=cooldown_remaining,
             should_alert=should_alert,
+            decision_count=decision_count,
         )
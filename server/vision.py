@@ -4,7 +4,6 @@ from dataclasses import dataclass
 from typing import Any
 
 import numpy as np
-from ultralytics import YOLO
 
 
 @dataclass
@@ -25,6 +24,8 @@ class VisionResult:
 
 class ChairCounter:
     def __init__(self, model_name: str, chair_class_name: str, conf_threshold: float):
+        from ultralytics import YOLO
+
         self.model = YOLO(model_name)
         self.conf_threshold = conf_threshold
         self.class_name_to_id = {name: idx for idx, name in self.model.names.items()}
@@ -67,3 +68,30 @@ class ChairCounter:
         count = len(accepted_boxes)
         avg_conf = float(sum(accepted_confs) / count) if count else 0.0
         return VisionResult(chair_count=count, average_conf=avg_conf, detections=accepted_boxes)
+
+
+class StubCounter:
+    """Model-free stand-in for ChairCounter (load tests, CI without weights).
+
+    The count follows mean frame brightness, so recordings or synthetic
+    frames that change brightness produce count changes and alerts.
+    """
+
+    def __init__(self, max_count: int = 6, conf: float = 0.8):
+        self.max_count = max_count
+        self.conf = conf
+
+    def count_chairs(self, frame_bgr: np.ndarray) -> VisionResult:
+        count = int(round(float(frame_bgr.mean()) / 255.0 * self.max_count))
+        width = 1.0 / max(1, count)
+        detections = [
+            DetectionBox(
+                x1_norm=i * width,
+                y1_norm=0.25,
+                x2_norm=(i + 1) * width,
+                y2_norm=0.75,
+                conf=self.conf,
+            )
+            for i in range(count)
+        ]
+        return VisionResult(chair_count=count, average_conf=self.conf if count else 0.0, detections=detections)
@@ -0,0 +1,86 @@
+"""SharedStateBackend across processes: flock transactions and launch liveness."""
+from __future__ import annotations
+
+import multiprocessing as mp
+import threading
+
+from server.backend import SharedStateBackend
+
+PROCESSES = 4
+THREADS = 2
+INCREMENTS = 200
+
+
+def _backend(directory: str) -> SharedStateBackend:
+    return SharedStateBackend(directory, debounce_k=3, cooldown_sec=10)
+
+
+def _increment(directory: str, start: mp.Event) -> None:
+    backend = _backend(directory)
+    start.wait()
+
+    def work() -> None:
+        for _ in range(INCREMENTS):
+            with backend.transaction() as sm:
+                # Read-modify-write across the whole transaction: lost updates show up as a short count.
+                sm.baseline_count = (sm.baseline_count or 0) + 1
+
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _hold(directory: str, ready: mp.Event, release: mp.Event) -> None:
+    backend = _backend(directory)
+    with backend.transaction() as sm:
+        sm.set_baseline(7)
+    ready.set()
+    release.wait()
+
+
+def _probe(directory: str, results: mp.Queue) -> None:
+    backend = _backend(directory)
+    results.put((backend.fresh, backend.view().baseline_count))
+
+
+def _run(ctx: mp.context.BaseContext, target, *args) -> None:
+    proc = ctx.Process(target=target, args=args)
+    proc.start()
+    proc.join(30)
+    assert proc.exitcode == 0
+
+
+def test_transactions_are_atomic_across_processes(tmp_path):
+    ctx = mp.get_context("spawn")
+    start = ctx.Event()
+    holder = _backend(str(tmp_path))  # keeps the state live while the workers come and go
+    procs = [ctx.Process(target=_increment, args=(str(tmp_path), start)) for _ in range(PROCESSES)]
+    for proc in procs:
+        proc.start()
+    start.set()
+    for proc in procs:
+        proc.join(60)
+        assert proc.exitcode == 0
+    assert holder.view().baseline_count == PROCESSES * THREADS * INCREMENTS
+
+
+def test_state_is_shared_only_while_a_worker_is_running(tmp_path):
+    # Probes run in their own processes: the liveness flock of a backend is held until its process exits.
+    ctx = mp.get_context("spawn")
+    ready, release = ctx.Event(), ctx.Event()
+    results = ctx.Queue()
+    holder = ctx.Process(target=_hold, args=(str(tmp_path), ready, release))
+    holder.start()
+    try:
+        assert ready.wait(30)
+        _run(ctx, _probe, str(tmp_path), results)
+        assert results.get(timeout=30) == (False, 7)
+    finally:
+        release.set()
+        holder.join(30)
+
+    # Every worker of that launch has exited: the leftover state.bin is not live state.
+    _run(ctx, _probe, str(tmp_path), results)
+    assert results.get(timeout=30) == (True, None)
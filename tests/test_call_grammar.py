@@ -0,0 +1,98 @@
+"""Call grammar matching and the constrained-decoding logits processor."""
+from __future__ import annotations
+
+import pytest
+
+from server.agent_gemma import CallGrammarProcessor, match_call
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        'trigger_alert(severity="high", message="Mr. Richard, 2 cups removed from staging area.")',
+        'ignore_event(reason="Only 3 discrepant frames. Waiting for confirmation.")',
+        "rebaseline(new_count=7)",
+        '  rebaseline(new_count=12)',
+    ],
+)
+def test_complete_calls(text):
+    assert match_call(text) == "complete"
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "trig", 'trigger_alert(severity="me', 'ignore_event(reason="Only 3', "rebaseline(new_count=1"],
+)
+def test_prefixes(text):
+    assert match_call(text) == "prefix"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "hello",
+        'trigger_alert(severity="urgent"',
+        "rebaseline(new_count=)",
+        "rebaseline(new_count=x",
+        'ignore_event(reason="ok") trailing',
+        'ignore_event(reason="two\nlines")',
+    ],
+)
+def test_invalid(text):
+    assert match_call(text) is None
+
+
+class FakeTokenizer:
+    """One token per character, plus special tokens that decode to nothing."""
+
+    EOS, END_OF_TURN, PAD = 0, 1, 2
+    all_special_ids = [EOS, END_OF_TURN, PAD]
+
+    def __init__(self, alphabet: str):
+        self.vocab = {i + 3: ch for i, ch in enumerate(alphabet)}
+        self.ids = {ch: i for i, ch in self.vocab.items()}
+
+    def encode(self, text: str) -> list[int]:
+        return [self.ids[ch] for ch in text]
+
+    def decode(self, ids, skip_special_tokens: bool = False) -> str:
+        return "".join(self.vocab.get(i, "") for i in ids)
+
+
+def _step(torch, processor, tokenizer, generated: str, preferred: list[int]) -> int:
+    """Run the processor once with `preferred` ranked highest (in order); return the surviving token."""
+    size = len(tokenizer.vocab) + 3
+    scores = torch.zeros((1, size))
+    for rank, token in enumerate(preferred):
+        scores[0, token] = 100.0 - rank
+    input_ids = torch.tensor([[99 % size] * processor.prompt_len + tokenizer.encode(generated)])
+    out = processor(input_ids, scores)
+    allowed = torch.isfinite(out[0]).nonzero().flatten().tolist()
+    assert len(allowed) >= 1
+    return int(out[0].argmax())
+
+
+def test_processor_masks_special_tokens_mid_call():
+    torch = pytest.importorskip("torch")
+    tokenizer = FakeTokenizer('abcdefghijklmnopqrstuvwxyz_()="0123456789 ,.')
+    processor = CallGrammarProcessor(tokenizer, prompt_len=2, top_k=8)
+    nxt = tokenizer.ids["="]
+    # EOS is the model's favourite, but the call is unfinished: it must not end here.
+    chosen = _step(torch, processor, tokenizer, "rebaseline(new_count", [tokenizer.EOS, tokenizer.PAD, nxt])
+    assert chosen == nxt
+
+
+def test_processor_rejects_tokens_that_leave_the_grammar():
+    torch = pytest.importorskip("torch")
+    tokenizer = FakeTokenizer('abcdefghijklmnopqrstuvwxyz_()="0123456789 ,.')
+    processor = CallGrammarProcessor(tokenizer, prompt_len=2, top_k=8)
+    chosen = _step(torch, processor, tokenizer, "rebaseline(new_count=4", [tokenizer.ids["x"], tokenizer.ids[")"]])
+    assert chosen == tokenizer.ids[")"]
+
+
+def test_processor_leaves_complete_calls_unconstrained():
+    torch = pytest.importorskip("torch")
+    tokenizer = FakeTokenizer('abcdefghijklmnopqrstuvwxyz_()="0123456789 ,.')
+    processor = CallGrammarProcessor(tokenizer, prompt_len=2, top_k=8)
+    chosen = _step(torch, processor, tokenizer, "rebaseline(new_count=4)", [tokenizer.EOS])
+    assert chosen == tokenizer.EOS
@@ -0,0 +1,72 @@
+"""Rule tier of the decision cascade."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from server.cascade import DecisionCascade, rule_call
+
+
+class FakeGemma:
+    def __init__(self, ready: bool):
+        self.is_ready = ready
+
+
+@pytest.mark.parametrize(
+    "scene, expected",
+    [
+        ((3, 5, 8, 0.90), 'trigger_alert(severity="high", message="Mr. Richard, 2 cups removed from staging area.")'),
+        ((6, 5, 7, 0.90), 'trigger_alert(severity="medium", message="Mr. Richard, 1 cup added from staging area.")'),
+        ((4, 5, 13, 0.90), 'trigger_alert(severity="high", message="Mr. Richard, 1 cup removed from staging area.")'),
+        ((4, 5, 5, 0.90), 'ignore_event(reason="Only 5 discrepant frames. Waiting for confirmation.")'),
+        ((4, 5, 8, 0.39), 'ignore_event(reason="Confidence too low (0.39). Detection unreliable.")'),
+        ((7, 5, 20, 0.40), "rebaseline(new_count=7)"),
+        ((5, 5, 8, 0.90), 'ignore_event(reason="Only 8 discrepant frames. Waiting for confirmation.")'),
+    ],
+)
+def test_rule_call(scene, expected):
+    assert rule_call(*scene) == expected
+
+
+def test_rules_do_not_cover_low_confidence_long_streaks():
+    assert rule_call(7, 5, 25, 0.30) is None
+
+
+@pytest.mark.parametrize(
+    "streak, conf, history, borderline",
+    [
+        (10, 0.80, [5, 5, 4, 4, 4], False),
+        (5, 0.80, [5, 4, 4], True),     # one below the alert threshold
+        (7, 0.80, [5, 4, 4], True),     # one above it
+        (19, 0.80, [4, 4], True),       # next to rebaseline
+        (10, 0.44, [4, 4], True),       # confidence within 0.05 of 0.40
+        (10, 0.46, [4, 4], False),
+        (10, 0.80, [5, 4, 5, 4, 4], True),  # three flips in the tail
+        (10, 0.80, [5, 4, 5, 4] + [4] * 8, False),  # flips older than the last 8 frames
+    ],
+)
+def test_is_borderline(streak, conf, history, borderline):
+    cascade = DecisionCascade(FakeGemma(ready=False))
+    assert cascade.is_borderline(streak, conf, history) is borderline
+
+
+def test_availability_follows_gemma_enabled():
+    assert DecisionCascade(FakeGemma(ready=False), gemma_enabled=True).available
+    assert not DecisionCascade(FakeGemma(ready=True), gemma_enabled=False).available
+    assert not DecisionCascade(FakeGemma(ready=False), enabled=False).available
+
+
+def test_rule_answer_while_gemma_is_loading():
+    async def decide():
+        cascade = DecisionCascade(FakeGemma(ready=False))
+        clear = await cascade.decide_async("s", 3, 5, 10, 0.9, [5, 3, 3, 3])
+        borderline = await cascade.decide_async("s", 3, 5, 6, 0.9, [5, 3, 3, 3])
+        outside = await cascade.decide_async("s", 7, 5, 25, 0.3, [7, 7])
+        return clear, borderline, outside, cascade.stats()
+
+    clear, borderline, outside, stats = asyncio.run(decide())
+    assert (clear.action, clear.source) == ("trigger_alert", "rules")
+    assert (borderline.action, borderline.source) == ("trigger_alert", "rules")
+    assert outside is None
+    assert stats["rule_resolved"] == 2 and stats["unresolved"] == 1 and stats["escalated"] == 0
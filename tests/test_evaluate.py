@@ -0,0 +1,100 @@
+"""Scoring in finetune/evaluate.py, plus a tiny-model smoke run."""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from finetune import evaluate, generate_dataset as gd
+from server.agent_gemma import DecisionCache, GemmaAgent, _parse_output
+
+
+BUILT = [
+    gd.trigger_alert(5, -2, 8, 0.90),
+    gd.rebaseline(4, 2, 25, 0.80),
+    gd.ignore_low_streak(6, 1, 3, 0.70),
+    gd.ignore_low_conf(5, -1, 10, 0.25),
+]
+
+
+@pytest.fixture
+def eval_file(tmp_path):
+    path = tmp_path / "eval.jsonl"
+    with open(path, "w") as f:
+        for _, user, call in BUILT:
+            f.write(json.dumps(gd.fmt(user, call)) + "\n")
+    return path
+
+
+def _decision(call, count):
+    decision = _parse_output(call, count)
+    decision.raw_output = call
+    return decision
+
+
+def test_load_examples(eval_file):
+    examples = evaluate.load_examples(eval_file)
+    assert [expected for _, expected in examples] == [call for _, _, call in BUILT]
+    assert examples[0][0] == (3, 5, 8, 0.90, [5, 5, 3, 3, 3, 3, 3, 3])
+    assert examples[1][0][:4] == (6, 4, 25, 0.80)
+    assert evaluate.load_examples(eval_file, limit=2) == examples[:2]
+
+
+def test_score_perfect_predictions(eval_file):
+    examples = evaluate.load_examples(eval_file)
+    report = evaluate.score(examples, [_decision(expected, scene[0]) for scene, expected in examples])
+    assert report["n"] == 4
+    assert report["accuracy"] == report["exact_match"] == 1.0
+    assert report["parse_failures"] == 0
+    assert report["per_action"]["ignore_event"] == {"precision": 1.0, "recall": 1.0, "support": 2}
+
+
+def test_score_counts_misses_and_failures(eval_file):
+    examples = evaluate.load_examples(eval_file)
+    predictions = [
+        _decision('trigger_alert(severity="high", message="Mr. Richard, 2 cups removed.")', 3),  # right action, not exact
+        _decision('ignore_event(reason="Not sure.")', 6),  # rebaseline labelled, ignore predicted
+        None,                                              # generation failed
+        _decision(examples[3][1], examples[3][0][0]),
+    ]
+    report = evaluate.score(examples, predictions)
+    assert report["accuracy"] == 0.5
+    assert report["exact_match"] == 0.25
+    assert report["parse_failures"] == 1
+    assert report["per_action"]["trigger_alert"] == {"precision": 1.0, "recall": 1.0, "support": 1}
+    assert report["per_action"]["rebaseline"] == {"precision": 0.0, "recall": 0.0, "support": 1}
+    assert report["per_action"]["ignore_event"] == {"precision": 0.5, "recall": 0.5, "support": 2}
+
+
+def _tiny_model(path):
+    """Random 1-layer Llama with a byte-level tokenizer, built offline."""
+    transformers = pytest.importorskip("transformers")
+    pytest.importorskip("accelerate")  # GemmaAgent.load passes device_map
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+
+    byte_chars = sorted(pre_tokenizers.ByteLevel.alphabet())
+    vocab = {tok: i for i, tok in enumerate(["<pad>", "<eos>", "<bos>", *byte_chars])}
+    tokenizer = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="<eos>", bos_token="<bos>"
+    ).save_pretrained(path)
+    config = transformers.LlamaConfig(
+        vocab_size=len(vocab), hidden_size=16, intermediate_size=32, num_hidden_layers=1,
+        num_attention_heads=2, num_key_value_heads=2, pad_token_id=0, eos_token_id=1, bos_token_id=2,
+    )
+    transformers.LlamaForCausalLM(config).save_pretrained(path)
+    return str(path)
+
+
+def test_tiny_model_end_to_end(eval_file, tmp_path):
+    model_dir = _tiny_model(tmp_path / "tiny")
+    agent = GemmaAgent(model_dir, None, None, decision_cache=DecisionCache(max_size=0))
+    assert agent.load()
+    examples = evaluate.load_examples(eval_file)
+    predictions, latency = evaluate.evaluate(agent, examples, batch_size=2)
+    report = evaluate.score(examples, predictions)
+    assert len(predictions) == report["n"] == 4
+    assert latency["batches"] == 2
+    assert sum(m["support"] for m in report["per_action"].values()) == 4
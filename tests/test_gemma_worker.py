@@ -0,0 +1,29 @@
+"""Inference worker of GemmaAgent, with decide_batch stubbed out."""
+from __future__ import annotations
+
+import asyncio
+
+from server.agent_gemma import GemmaAgent, GemmaDecision
+
+
+def test_failed_batch_resolves_none_and_worker_keeps_going(monkeypatch):
+    agent = GemmaAgent("base", None, None, batch_window_ms=0)
+    calls = []
+
+    def decide_batch(scenes):
+        calls.append(len(scenes))
+        if len(calls) == 1:
+            raise RuntimeError("CUDA out of memory")
+        return [GemmaDecision("rebaseline", None, None, None, 4)] * len(scenes)
+
+    monkeypatch.setattr(agent, "decide_batch", decide_batch)
+
+    async def run():
+        first = await asyncio.wait_for(agent.decide_async("a", 4, 5, 25, 0.9, [4] * 8), 5)
+        second = await asyncio.wait_for(agent.decide_async("b", 4, 5, 25, 0.9, [4] * 8), 5)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is None
+    assert second is not None and second.action == "rebaseline"
+    assert agent.queue_stats()["completed"] == 2
@@ -0,0 +1,25 @@
+"""Per-session heatmap retention."""
+from __future__ import annotations
+
+from server.heatmap import OccupancyHeatmap, keep_recent
+
+
+def test_new_session_survives_a_full_registry():
+    heatmaps: dict[str, OccupancyHeatmap] = {}
+    for i in range(40):
+        session_id = f"ws-1-{i:x}"
+        keep_recent(heatmaps, session_id, OccupancyHeatmap(4, 4), limit=32)
+        # Reconnecting phones must see their own grid, not evict it on arrival.
+        assert session_id in heatmaps
+        assert len(heatmaps) <= 32
+    assert set(heatmaps) == {f"ws-1-{i:x}" for i in range(8, 40)}
+
+
+def test_least_recently_updated_session_is_evicted():
+    heatmaps: dict[str, OccupancyHeatmap] = {}
+    grids = [OccupancyHeatmap(4, 4) for _ in range(3)]
+    for i, grid in enumerate(grids):
+        keep_recent(heatmaps, f"s{i}", grid, limit=3)
+    grids[0].updated_at = grids[2].updated_at + 10  # s0 is still streaming
+    keep_recent(heatmaps, "s3", OccupancyHeatmap(4, 4), limit=3)
+    assert set(heatmaps) == {"s0", "s2", "s3"}
@@ -0,0 +1,71 @@
+"""DashboardBus: delivery between workers and cleanup of sockets left by exited ones."""
+from __future__ import annotations
+
+import asyncio
+import socket
+
+from server.pubsub import DashboardBus
+
+
+def _bus(directory, name: str) -> DashboardBus:
+    # Real workers are told apart by pid; in one test process, by name.
+    bus = DashboardBus(directory)
+    bus.path = bus.directory / f"{name}.sock"
+    return bus
+
+
+def test_publish_reaches_other_workers_only(tmp_path):
+    async def scenario() -> tuple[list, list]:
+        inbox_a, inbox_b = [], []
+        got_b = asyncio.Event()
+
+        async def deliver_a(payload):
+            inbox_a.append(payload)
+
+        async def deliver_b(payload):
+            inbox_b.append(payload)
+            got_b.set()
+
+        a, b = _bus(tmp_path, "a"), _bus(tmp_path, "b")
+        await a.start(deliver_a)
+        await b.start(deliver_b)
+        try:
+            for i in range(3):
+                a.publish({"type": "event", "seq": i})
+            await asyncio.wait_for(got_b.wait(), 5)
+            while len(inbox_b) < 3:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+        finally:
+            a.close()
+            b.close()
+        return inbox_a, inbox_b
+
+    inbox_a, inbox_b = asyncio.run(scenario())
+    assert [p["seq"] for p in inbox_b] == [0, 1, 2]
+    assert inbox_a == []
+    assert not list(tmp_path.glob("*.sock"))
+
+
+def test_sockets_of_exited_workers_are_removed(tmp_path):
+    # A worker that died without unlinking: the path exists but nobody is bound to it.
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    dead.bind(str(tmp_path / "999999.sock"))
+    dead.close()
+
+    async def scenario() -> dict:
+        async def deliver(payload):
+            pass
+
+        bus = _bus(tmp_path, "live")
+        await bus.start(deliver)
+        try:
+            bus.publish({"type": "event"})
+            return bus.stats()
+        finally:
+            bus.close()
+
+    stats = asyncio.run(scenario())
+    assert not (tmp_path / "999999.sock").exists()
+    assert stats["peers"] == 0
+    assert stats["dropped"] == 0
@@ -0,0 +1,62 @@
+"""RollingWindow incremental statistics against a from-scratch recomputation."""
+from __future__ import annotations
+
+import random
+import statistics
+
+import pytest
+
+from server.rolling import RollingWindow
+
+
+def _expected_mode(values: list[int]) -> int:
+    freq = {v: values.count(v) for v in values}
+    top = max(freq.values())
+    winners = {v for v, n in freq.items() if n == top}
+    return values[-1] if values[-1] in winners else min(winners)
+
+
+@pytest.mark.parametrize("capacity", [1, 2, 5, 20])
+def test_statistics_match_recomputation_after_wraparound(capacity):
+    rng = random.Random(capacity)
+    window = RollingWindow(capacity)
+    counts: list[int] = []
+    confs: list[float] = []
+    for _ in range(capacity * 7 + 3):  # several full turns of the ring
+        count, conf = rng.choice([3, 4, 4, 5, 5, 5, 6]), round(rng.uniform(0.2, 0.95), 2)
+        window.push(count, conf)
+        counts.append(count)
+        confs.append(conf)
+        tail_counts, tail_confs = counts[-capacity:], confs[-capacity:]
+
+        assert len(window) == len(tail_counts)
+        assert window.counts().tolist() == tail_counts
+        assert window.confs().tolist() == tail_confs
+        assert window.latest() == tail_counts[-1]
+        assert window.count_mean() == pytest.approx(statistics.fmean(tail_counts))
+        assert window.count_var() == pytest.approx(statistics.pvariance(tail_counts), abs=1e-9)
+        assert window.conf_var() == pytest.approx(statistics.pvariance(tail_confs), abs=1e-9)
+        assert window.count_median() == statistics.median(tail_counts)
+        assert window.conf_median() == pytest.approx(statistics.median(tail_confs))
+        assert window.count_mode() == _expected_mode(tail_counts)
+        assert window.smoothed_count("mode") == _expected_mode(tail_counts)
+        assert window.smoothed_count("median") == sorted(tail_counts)[(len(tail_counts) - 1) // 2]
+        assert window.smoothed_count("none") == tail_counts[-1]
+
+
+def test_counts_view_is_read_only():
+    window = RollingWindow(3)
+    for count in (1, 2, 3, 4):
+        window.push(count, 0.5)
+    view = window.counts()
+    assert view.tolist() == [2, 3, 4]
+    with pytest.raises(ValueError):
+        view[0] = 9
+
+
+def test_empty_window():
+    window = RollingWindow(4)
+    assert window.latest() is None
+    assert window.count_mode() is None
+    assert window.smoothed_count("median") is None
+    assert window.count_var() == 0.0